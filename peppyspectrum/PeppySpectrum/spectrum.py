@@ -20,16 +20,63 @@ import time
 import logging
 import sys
 import os
+import signal
+import numpy as np
 
 from spectrumcomponent import SpectrumComponent
 from spectrumcontainer import SpectrumContainer
+from spectrumbars import SpectrumBars, SpectrumLayout
+from spectrumatlas import SpectrumAtlas
+from spectrumpipe import SpectrumPipe
+from spectrumshm import SpectrumShmReader
+from spectrumanalyzer import SpectrumAnalyzer
+from spectrumframe import SpectrumFrameDecoder
+from spectrumscheduler import SpectrumScheduler
+from spectrumframebuffer import SpectrumFrameBuffer
+from spectruminterpolator import SpectrumInterpolator
+from spectrumdynamics import SpectrumDynamics
+from spectrumworker import SpectrumWorker
+from spectrumdiskcache import SpectrumDiskCache
+from spectrumpixelformat import SpectrumPixelFormat
+from spectrumframebufferdevice import SpectrumFramebufferDevice
+from spectrumstats import SpectrumStats
+from spectrumrecording import SpectrumRecorder, SpectrumReplay
+from spectrumgovernor import SpectrumGovernor, TIER_FULL, TIER_NO_REFLECTIONS, TIER_NO_TOPPINGS, TIER_LOW_FRAME_RATE, TIER_COARSE_STEPS
 from random import randrange
-from threading import Thread
+from threading import Thread, Timer, Lock
+from collections import OrderedDict
 from itertools import cycle
 from screensaverspectrum import ScreensaverSpectrum
 from spectrumutil import SpectrumUtil
 from spectrumconfigparser import *
 
+IDLE_POLL_INTERVAL = 0.5
+PREFETCH_TIME = 2.0 # start loading the next layout this time before the update period expires
+
+def create_data_source(config):
+    """ Create data source defined in configuration
+
+    :param config: the configuration dictionary
+
+    :return: named pipe, shared memory reader, PCM analyzer or recording player.
+        Frames read from the first three are written to the record file if it's defined.
+    """
+    if config[DATA_SOURCE] == "replay":
+        return SpectrumReplay(config[REPLAY_FILE], config[REPLAY_REALTIME], config[REPLAY_LOOP])
+    elif config[DATA_SOURCE] == "shm":
+        interval = config[UPDATE_UI_INTERVAL] / 4
+        source = SpectrumShmReader(config[SHM_NAME], config[PIPE_SIZE], interval)
+    elif config[DATA_SOURCE] == "fft":
+        source = SpectrumAnalyzer(config[PCM_PIPE_NAME], config[PCM_FORMAT], config[PCM_RATE],
+            config[PCM_CHANNELS], config[FFT_SIZE], config[SIZE], config[MAX_VALUE])
+    else:
+        source = SpectrumPipe(config[PIPE_NAME], config[PIPE_SIZE], config[PIPE_BUFFER_SIZE])
+
+    if config[RECORD_FILE]:
+        return SpectrumRecorder(source, config[RECORD_FILE])
+    else:
+        return source
+
 class Spectrum(SpectrumContainer, ScreensaverSpectrum):
     """ Spectrum Analyzer screensaver plug-in. """
         
@@ -57,7 +104,11 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
         self.config_parser = SpectrumConfigParser(self.standalone)
         self.config = self.config_parser.config
         self.update_period = self.config[UPDATE_PERIOD]
+        if not util:
+            self.util.image_cache.set_budget(self.config[IMAGE_CACHE_SIZE])
+            self.util.set_scale_filter(self.config[SCALE_FILTER])
 
+        self.framebuffer_device = None
         if self.standalone:
             screen_rect = pygame.Rect(0, 0, self.config[SCREEN_WIDTH], self.config[SCREEN_HEIGHT])
             self.init_display()
@@ -65,13 +116,53 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
         else:
             SpectrumContainer.__init__(self, util, bounding_box=util.screen_rect, background=self.bg[1], content=self.bg[2], image_filename=self.bg[3])
 
-        self.pipe = None
+        self.data_source = self.get_data_source()
+        self.frame_decoder = SpectrumFrameDecoder(self.config[SIZE])
+        self.frame_buffer = SpectrumFrameBuffer(self.config[SIZE])
+        self.frame_sequence = 0
+        self.worker = None
+        if self.config[INTERPOLATION_FRAMES] > 0:
+            self.interpolator = SpectrumInterpolator(self.config[SIZE], self.config[INTERPOLATION_FRAMES], self.config[INTERPOLATION_CURVE])
+        else:
+            self.interpolator = None
+        self.dynamics = SpectrumDynamics(self.config[SIZE])
+        self.dynamics_time = time.monotonic()
+        self.frame_time = 0
+        self.active_time = time.monotonic()
+        self.idle = False
         self.spectrum_configs = self.config_parser.spectrum_configs
         self.indexes = cycle(range(len(self.spectrum_configs)))
-        self.seconds = 0
-        self.test_iterator = 0
+        self.index = 0
+        self.next_index = next(self.indexes)
+        self.refresh_time = time.monotonic()
+        self.scheduler = SpectrumScheduler(self.config[FRAME_RATE])
+        if self.config[QUALITY_GOVERNOR]:
+            self.governor = SpectrumGovernor(self.config[QUALITY_CPU_LIMIT])
+        else:
+            self.governor = None
+        if self.config[STATS_FILE]:
+            self.stats = SpectrumStats(self.config[STATS_FILE], self.config[STATS_INTERVAL])
+            self.stats.attach(self)
+            self.set_stats_signal()
+        else:
+            self.stats = None
+        self.tier = TIER_FULL
+        test_data = TEST_DATA.get(self.config[USE_TEST_DATA])
+        self.test_frames = cycle(test_data) if test_data and len(test_data) == 8 else None
+        self.layouts = [SpectrumLayout(config, self.config[SIZE], self.config[MAX_VALUE]) for config in self.spectrum_configs]
+        if self.config[ASSET_CACHE_FOLDER]:
+            self.disk_cache = SpectrumDiskCache(self.config[ASSET_CACHE_FOLDER], self.config[ASSET_CACHE_SIZE])
+        else:
+            self.disk_cache = None
+        if self.config[OPTIMIZE_PIXEL_FORMAT]:
+            self.pixel_format = SpectrumPixelFormat(self.util.pygame_screen)
+        else:
+            self.pixel_format = None
         self.init_spectrums()
         self.init_container()
+        self.batch_blits = self.config[BATCH_BLITS]
+        self.dirty_rectangles = self.config[DIRTY_RECTANGLES]
+        self.full_redraw = True
         self.height_adjuster = 1.0
 
         if "win" in sys.platform:
@@ -79,8 +170,9 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
             self.config[UPDATE_UI_INTERVAL] = 0.1
         else:
             self.windows = False
-            thread = Thread(target=self.open_pipe)
-            thread.start()
+            if not (self.standalone and self.config[MULTIPROCESS]): # the worker process opens its own data source
+                thread = Thread(target=self.open_data_source)
+                thread.start()
 
     def init_display(self):
         """ Initialize Pygame display """
@@ -97,8 +189,17 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
         else:
             os.environ["SDL_NOMOUSE"] = "1"
         
+        if self.config[OUTPUT] == "framebuffer" and "win" not in sys.platform:
+            self.framebuffer_device = SpectrumFramebufferDevice(self.config[FRAMEBUFFER_DEVICE], screen_w, screen_h, self.config[DEPTH])
+            if not self.framebuffer_device.open():
+                logging.error(f"Cannot open framebuffer {self.config[FRAMEBUFFER_DEVICE]}, using video driver {self.config[VIDEO_DRIVER]}")
+                self.framebuffer_device = None
+
         if "win" not in sys.platform:
-            if not self.config[VIDEO_DRIVER] == "dummy":
+            if self.framebuffer_device:
+                os.environ["SDL_VIDEODRIVER"] = "dummy" # render offscreen, copy to the framebuffer
+                depth = 32
+            elif not self.config[VIDEO_DRIVER] == "dummy":
                 os.environ["SDL_VIDEODRIVER"] = self.config[VIDEO_DRIVER]
                 os.environ["DISPLAY"] = self.config[VIDEO_DISPLAY]
             pygame.display.init()
@@ -120,29 +221,154 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
             else:
                 self.util.pygame_screen = pygame.display.set_mode((screen_w, screen_h))
 
+        if self.framebuffer_device and self.framebuffer_device.bits_per_pixel == 16:
+            self.util.pygame_screen = self.framebuffer_device.get_surface(screen_w, screen_h) # draw in the framebuffer format
+
+    def update(self):
+        """ Update the whole screen """
+
+        if self.framebuffer_device:
+            self.framebuffer_device.update(self.util.pygame_screen, self.bounding_box)
+        else:
+            SpectrumContainer.update(self)
+
+    def update_rectangle(self, r):
+        """ Update screen rectangles
+
+        :param r: rectangle or list of rectangles
+        """
+        if self.framebuffer_device:
+            self.framebuffer_device.update(self.util.pygame_screen, r)
+        else:
+            SpectrumContainer.update_rectangle(self, r)
+
+    def set_stats_signal(self):
+        """ Write the stats file on SIGUSR1 """
+
+        if not self.standalone or not hasattr(signal, "SIGUSR1"):
+            return
+
+        try:
+            signal.signal(signal.SIGUSR1, self.stats.request_write)
+        except Exception as e:
+            logging.debug("Cannot set SIGUSR1 handler")
+            logging.debug(e)
+
     def init_container(self):
         """ Initialize container """
         
         c = SpectrumComponent(self.util) # bgr
         self.add_component(c)
-        for _ in range(self.config[SIZE]):
-            c = SpectrumComponent(self.util) # bar
-            self.add_component(c)
-            c = SpectrumComponent(self.util) # reflection
-            self.add_component(c)
-            c = SpectrumComponent(self.util) # topping
-            self.add_component(c)
+        self.bars = SpectrumBars(self.util, self.config[SIZE]) # bars, reflections and toppings
+        self.add_component(self.bars)
         c = SpectrumComponent(self.util) # fgr
         self.add_component(c)
     
     def init_spectrums(self):
-        """ Initialize lists of images """
+        """ Initialize lists of images. The images are loaded on demand for each layout. """
         
-        self.bgr = self.get_backgrounds()
-        self.bar = self.get_bars()
-        self.reflection = self.get_reflections()
-        self.toppings = self.get_toppings()
-        self.fgr = self.get_foregrounds()
+        n = len(self.spectrum_configs)
+        self.bgr = [None] * n
+        self.bar = [None] * n
+        self.reflection = [None] * n
+        self.toppings = [None] * n
+        self.fgr = [None] * n
+        self.atlases = [None] * n
+        self.atlas_memory = 0
+        self.loaded_layouts = OrderedDict()
+        self.layouts_lock = Lock()
+        self.prefetch_timer = None
+        self.load_layout(self.index)
+
+    def load_layout(self, index):
+        """ Load images of the layout and mark the layout as the most recently used one.
+        The least recently used layouts above the layout cache size are unloaded.
+
+        :param index: layout index
+        """
+        with self.layouts_lock:
+            if index in self.loaded_layouts:
+                self.loaded_layouts.move_to_end(index)
+                return
+
+            start_time = time.monotonic()
+            config = self.spectrum_configs[index]
+            self.bgr[index] = self.get_background(config)
+            self.bar[index] = self.get_bar(config)
+            self.reflection[index] = self.get_reflection(config)
+            self.fgr[index] = self.get_foreground(config)
+            self.atlases[index] = self.get_atlas(index)
+            self.optimize_pixel_format(index)
+            self.toppings[index] = self.get_topping(index)
+            self.loaded_layouts[index] = True
+
+            load_time = time.monotonic() - start_time
+            if self.disk_cache:
+                logging.debug(f"Images of spectrum {index} loaded in {load_time:.3f} s, cache hits: {self.disk_cache.hits}, cache misses: {self.disk_cache.misses}")
+            else:
+                logging.debug(f"Images of spectrum {index} loaded in {load_time:.3f} s")
+
+            if isinstance(self.image_util, SpectrumUtil):
+                c = self.image_util.image_cache
+                logging.debug(f"Image cache: {c.size} of {c.budget} bytes, hits: {c.hits}, misses: {c.misses}, evictions: {c.evictions}")
+
+            self.unload_layouts()
+
+    def optimize_pixel_format(self, index):
+        """ Convert layout images to the cheapest pixel formats. Atlas is created before from the images with alpha.
+
+        :param index: layout index
+        """
+        if self.pixel_format == None:
+            return
+
+        p = self.pixel_format
+        p.reset()
+        for images in (self.bgr, self.bar, self.reflection, self.fgr):
+            images[index] = p.optimize(images[index])
+
+        bits = self.util.pygame_screen.get_bitsize()
+        logging.debug(f"Pixel formats of spectrum {index} for {bits} bpp screen: {p.formats}, memory {p.memory_before} -> {p.memory_after} bytes, saved {p.memory_before - p.memory_after} bytes")
+
+    def unload_layouts(self):
+        """ Unload the least recently used layouts except the current one """
+
+        capacity = max(self.config[LAYOUT_CACHE_SIZE] + 1, 2) # the current layout and the prefetched one at least
+
+        while len(self.loaded_layouts) > capacity:
+            index = next(i for i in self.loaded_layouts if i != self.index)
+            del self.loaded_layouts[index]
+            if self.atlases[index]:
+                self.atlas_memory -= self.atlases[index].memory
+            self.bgr[index] = self.bar[index] = self.reflection[index] = None
+            self.toppings[index] = self.fgr[index] = self.atlases[index] = None
+            logging.debug(f"Images of spectrum {index} unloaded")
+
+    def prefetch_layout(self):
+        """ Load the next layout in the background shortly before the update period expires """
+
+        if self.prefetch_timer:
+            self.prefetch_timer.cancel()
+
+        delay = max(self.update_period - PREFETCH_TIME, 0)
+        self.prefetch_timer = Timer(delay, self.load_layout, (self.next_index,))
+        self.prefetch_timer.daemon = True
+        self.prefetch_timer.start()
+
+    def get_cached_surface(self, path, size, loader, variant=""):
+        """ Get image surface from the disk cache
+
+        :param path: the source image path
+        :param size: the target size or None for the original size
+        :param loader: the function creating the surface in case of cache miss
+        :param variant: the name of the scaling method
+
+        :return: the surface
+        """
+        if self.disk_cache == None:
+            return loader()
+
+        return self.disk_cache.get_surface(path, size, loader, variant)
 
     def get_color_surface(self, bounding_box, color):
         """ Create surface filled by solid color
@@ -172,7 +398,7 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
             return None
 
         size = len(gradient)
-        gradient.reverse()
+        gradient = gradient[::-1] # the first color is at the bottom, keep the config unchanged for reloading
         base_rect = pygame.Surface((2, size), pygame.SRCALPHA, 32)
 
         for index in range(size):
@@ -193,9 +419,11 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
         if not bounding_box or not path:
             return None
 
-        img = self.image_util.load_pygame_image(path)
+        def loader():
+            img = self.image_util.load_pygame_image(path)
+            return self.image_util.scale_image(img, bounding_box)
 
-        return self.image_util.scale_image(img, bounding_box)
+        return self.get_cached_surface(path, bounding_box, loader, self.config[SCALE_FILTER])
 
     def get_extended_image_surface(self, bounding_box, path):
         """ Create surface with image by extending input image
@@ -208,166 +436,182 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
         if not bounding_box or not path:
             return None
 
-        img = self.image_util.load_pygame_image(path)
-        image = pygame.transform.smoothscale(img[1], bounding_box)
+        def loader():
+            img = self.image_util.load_pygame_image(path)
+            image = pygame.transform.smoothscale(img[1], bounding_box)
+            return image.convert_alpha()
+
+        return self.get_cached_surface(path, bounding_box, loader, "extended")
 
-        return image.convert_alpha()
+    def load_image(self, path):
+        """ Load image without scaling
+
+        :param path: the image path
 
-    def get_backgrounds(self):
-        """ Prepare spectrum backgrounds
+        :return: the surface or None
+        """
+        b = self.image_util.load_pygame_image(path)
+
+        return b[1] if b else None
+
+    def get_background(self, config):
+        """ Prepare spectrum background
         
-        :return: the list of spectrum backgrounds
+        :param config: spectrum configuration
+
+        :return: spectrum background
         """
-        backgrounds = []
         w = self.bounding_box.w
         h = self.bounding_box.h
 
-        for config in self.spectrum_configs:
-            if config[BGR_TYPE] == "color":
-                backgrounds.append(self.get_color_surface((w, h), config[BGR_COLOR]))
-            elif config[BGR_TYPE] == "gradient":
-                backgrounds.append(self.get_gradient_surface((w, h), config[BGR_GRADIENT]))
-            elif config[BGR_TYPE] == "player.bgr":
-                b = pygame.Surface((w, h), pygame.SRCALPHA, 32)
-                b = b.convert_alpha()
-                backgrounds.append(b)
-            elif config[BGR_TYPE] == "image":
-                path = self.config_parser.get_path(config[BGR_FILENAME], self.config[SPECTRUM_FOLDER])
-                b = self.image_util.load_pygame_image(path)
-                backgrounds.append(b[1])
-            elif config[BGR_TYPE] == "image.extended":
-                path = self.config_parser.get_path(config[BGR_FILENAME], self.config[SPECTRUM_FOLDER])
-                backgrounds.append(self.get_extended_image_surface((w, h), path))
-
-        return backgrounds
-
-    def get_bars(self):
-        """ Prepare frequency bars
+        if config[BGR_TYPE] == "color":
+            return self.get_color_surface((w, h), config[BGR_COLOR])
+        elif config[BGR_TYPE] == "gradient":
+            return self.get_gradient_surface((w, h), config[BGR_GRADIENT])
+        elif config[BGR_TYPE] == "player.bgr":
+            b = pygame.Surface((w, h), pygame.SRCALPHA, 32)
+            return b.convert_alpha()
+        elif config[BGR_TYPE] == "image":
+            path = self.config_parser.get_path(config[BGR_FILENAME], self.config[SPECTRUM_FOLDER])
+            return self.get_cached_surface(path, None, lambda: self.load_image(path))
+        elif config[BGR_TYPE] == "image.extended":
+            path = self.config_parser.get_path(config[BGR_FILENAME], self.config[SPECTRUM_FOLDER])
+            return self.get_extended_image_surface((w, h), path)
+
+        return None
+
+    def get_bar(self, config):
+        """ Prepare frequency bar
         
-        :return: the list of frequency bars
+        :param config: spectrum configuration
+
+        :return: frequency bar
         """
-        bars = []
-
-        for config in self.spectrum_configs:
-            w = config[BAR_WIDTH]
-            h = config[BAR_HEIGHT]
-
-            if config[BAR_TYPE] == "color":
-                bars.append(self.get_color_surface((w, h), config[BAR_COLOR]))
-            elif config[BAR_TYPE] == "gradient":
-                bars.append(self.get_gradient_surface(((w, h)), config[BAR_GRADIENT]))
-            elif config[BAR_TYPE] == "image":
-                path = self.config_parser.get_path(config[BAR_FILENAME], self.config[SPECTRUM_FOLDER])
-                bars.append(self.get_image_surface((w, h), path))
-            elif config[BAR_TYPE] == "image.extended":
-                path = self.config_parser.get_path(config[BAR_FILENAME], self.config[SPECTRUM_FOLDER])
-                bars.append(self.get_extended_image_surface((w, h), path))
+        w = config[BAR_WIDTH]
+        h = config[BAR_HEIGHT]
+
+        if config[BAR_TYPE] == "color":
+            return self.get_color_surface((w, h), config[BAR_COLOR])
+        elif config[BAR_TYPE] == "gradient":
+            return self.get_gradient_surface(((w, h)), config[BAR_GRADIENT])
+        elif config[BAR_TYPE] == "image":
+            path = self.config_parser.get_path(config[BAR_FILENAME], self.config[SPECTRUM_FOLDER])
+            return self.get_image_surface((w, h), path)
+        elif config[BAR_TYPE] == "image.extended":
+            path = self.config_parser.get_path(config[BAR_FILENAME], self.config[SPECTRUM_FOLDER])
+            return self.get_extended_image_surface((w, h), path)
+
+        return None
+
+    def get_reflection(self, config):
+        """ Prepare reflection
         
-        return bars
+        :param config: spectrum configuration
 
-    def get_reflections(self):
-        """ Prepare reflections
-        
-        :return: the list of reflections
+        :return: reflection or None
         """
-        reflections = []
+        if not config.get(REFLECTION_TYPE, None):
+            return None
 
-        for config in self.spectrum_configs:
-            if not config.get(REFLECTION_TYPE, None):
-                reflections.append(None)
-                continue
+        w = config[BAR_WIDTH]
+        h = config[BAR_HEIGHT]
+
+        if config[REFLECTION_TYPE] == "color":
+            return self.get_color_surface((w, h), config[REFLECTION_COLOR])
+        elif config[REFLECTION_TYPE] == "gradient":
+            return self.get_gradient_surface(((w, h)), config[REFLECTION_GRADIENT])
+        elif config[REFLECTION_TYPE] == "image":
+            path = self.config_parser.get_path(config[REFLECTION_FILENAME], self.config[SPECTRUM_FOLDER])
+            return self.get_image_surface((w, h), path)
+        elif config[REFLECTION_TYPE] == "image.extended":
+            path = self.config_parser.get_path(config[REFLECTION_FILENAME], self.config[SPECTRUM_FOLDER])
+            return self.get_extended_image_surface((w, h), path)
 
-            w = config[BAR_WIDTH]
-            h = config[BAR_HEIGHT]
+        return None
 
-            if config[REFLECTION_TYPE] == "color":
-                reflections.append(self.get_color_surface((w, h), config[REFLECTION_COLOR]))
-            elif config[REFLECTION_TYPE] == "gradient":
-                reflections.append(self.get_gradient_surface(((w, h)), config[REFLECTION_GRADIENT]))
-            elif config[REFLECTION_TYPE] == "image":
-                path = self.config_parser.get_path(config[REFLECTION_FILENAME], self.config[SPECTRUM_FOLDER])
-                reflections.append(self.get_image_surface((w, h), path))
-            elif config[REFLECTION_TYPE] == "image.extended":
-                path = self.config_parser.get_path(config[REFLECTION_FILENAME], self.config[SPECTRUM_FOLDER])
-                reflections.append(self.get_extended_image_surface((w, h), path))
+    def get_topping(self, index):
+        """ Prepare topping
 
-        return reflections
+        :param index: layout index
 
-    def get_toppings(self):
-        """ Prepare toppings
+        :return: topping or None
+        """
+        if not self.spectrum_configs[index].get(TOPPING_HEIGHT, None):
+            return None
+
+        return self.bar[index]
+
+    def get_atlas(self, index):
+        """ Prepare sprite atlas with pre-rendered bar columns
+
+        :param index: layout index
 
-        :return: the list of frequency bars
+        :return: atlas or None
         """
-        toppings = []
+        if not self.config[ATLAS] or not self.bar[index]:
+            return None
 
-        for i, config in enumerate(self.spectrum_configs):
-            if not config.get(TOPPING_HEIGHT, None):
-                toppings.append(None)
-            else:
-                toppings.append(self.bar[i])
+        atlas = SpectrumAtlas(self.layouts[index], self.bar[index], self.reflection[index])
+        self.atlas_memory += atlas.memory
+        logging.debug(f"Atlas for spectrum {index}: {atlas.levels + 1} levels, {atlas.memory} bytes, atlas memory: {self.atlas_memory} bytes")
+
+        return atlas
 
-        return toppings
+    def get_foreground(self, config):
+        """ Prepare spectrum foreground
 
-    def get_foregrounds(self):
-        """ Prepare spectrum foregrounds
+        :param config: spectrum configuration
 
-        :return: the list of spectrum foregrounds
+        :return: spectrum foreground or None
         """
-        foregrounds = []
+        if not config.get(FGR_FILENAME):
+            return None
 
-        for config in self.spectrum_configs:
-            if not config.get(FGR_FILENAME):
-                foregrounds.append(None)
-            else:
-                path = self.config_parser.get_path(config[FGR_FILENAME], self.config[SPECTRUM_FOLDER])
-                b = self.image_util.load_pygame_image(path)
-                if b:
-                    foregrounds.append(b[1])
+        path = self.config_parser.get_path(config[FGR_FILENAME], self.config[SPECTRUM_FOLDER])
 
-        return foregrounds
+        return self.get_cached_surface(path, None, lambda: self.load_image(path))
 
+    def get_data_source(self):
+        """ Create data source defined in configuration
 
-    def open_pipe(self):
-        """ Open named pipe  """
+        :return: named pipe, shared memory reader, PCM analyzer or recording player
+        """
+        return create_data_source(self.config)
+
+    def open_data_source(self):
+        """ Open data source """
         
-        try:            
-            self.pipe = os.open(self.config[PIPE_NAME], os.O_RDONLY | os.O_NONBLOCK)
-        except Exception as e:
-            logging.debug("Cannot open named pipe: " + self.config[PIPE_NAME])
-            logging.debug(e)
+        self.data_source.open()
 
-    def flush_pipe_buffer(self):
-        """ Flush data from the pipe """
+    def flush_data_source(self):
+        """ Flush data from the data source """
 
-        if not self.pipe:
-            return
-
-        try:
-            os.read(self.pipe, self.config[PIPE_BUFFER_SIZE])
-        except Exception as e:
-            logging.debug(e)
+        self.data_source.flush()
 
     def start(self):
         """ Start spectrum thread. """ 
         
         self.index = 0
+        self.load_layout(self.index)
         self.set_background()
         self.set_bars()
-        self.reflection_gap = self.spectrum_configs[self.index].get(REFLECTION_GAP, 0)
-        self.set_reflections()
-        self.set_toppings()
         self.set_foreground()
-        
-        self.init_variables()
+        self.full_redraw = True
+        self.active_time = time.monotonic()
+        self.idle = False
 
         self.run_flag = True
-        self.start_data_source()
+        if self.standalone:
+            if self.config[MULTIPROCESS] and not self.windows:
+                self.worker = SpectrumWorker(self.config, self.layouts)
+                self.worker.start()
+            else:
+                self.flush_data_source()
+        else:
+            self.start_data_source()
 
         if hasattr(self, "callback_start"):
             self.callback_start(self)
-        else:
-            thread = Thread(target=self.update_ui)
-            thread.start()
 
         pygame.event.clear()
 
@@ -387,69 +631,44 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
         c.content_y = int(spectrum_y + ((h - size[1])/2))
     
     def set_bars(self):
-        """ Set spectrum bars  """
-        
-        width = self.spectrum_configs[self.index][BAR_WIDTH]
-        height = self.spectrum_configs[self.index][BAR_HEIGHT]
-        bar_gap = self.spectrum_configs[self.index][BAR_GAP]
-
-        for r in range(self.config[SIZE]):
-            c = self.components[r + 1]
-            origin_x = self.spectrum_configs[self.index][ORIGIN_X]
-            spectrum_x = self.spectrum_configs[self.index][SPECTRUM_X]
-            c.content_x = origin_x + spectrum_x + (r * (width + bar_gap))
-            origin_y = self.spectrum_configs[self.index][ORIGIN_Y]
-            spectrum_y = self.spectrum_configs[self.index][SPECTRUM_Y]
-            c.content_y = origin_y + spectrum_y - height
-            c.content = ("", self.bar[self.index])
-            c.bounding_box = pygame.Rect(0, 0, width, height)
-            c.visible = False
-
-    def set_reflections(self):
-        """ Set reflection bars """
-        
-        if self.reflection == [None]:
-            return
+        """ Set spectrum bars, reflections and toppings """
+
+        i = self.index
+        self.set_bar_surfaces()
+        self.dynamics.set_layout(self.layouts[i])
+        if self.interpolator:
+            self.interpolator.reset()
+
+    def set_bar_surfaces(self):
+        """ Set bar, reflection and topping surfaces allowed by the current quality tier """
 
-        width = self.spectrum_configs[self.index][BAR_WIDTH]
-        bar_gap = self.spectrum_configs[self.index][BAR_GAP]
-
-        for r in range(self.config[SIZE]):
-            c = self.components[r + 1 + self.config[SIZE]]
-            origin_x = self.spectrum_configs[self.index][ORIGIN_X]
-            spectrum_x = self.spectrum_configs[self.index][SPECTRUM_X]
-            c.content_x = origin_x + spectrum_x + (r * (width + bar_gap))
-            origin_y = self.spectrum_configs[self.index][ORIGIN_Y]
-            spectrum_y = self.spectrum_configs[self.index][SPECTRUM_Y]
-            c.content_y = origin_y + spectrum_y
-            c.content = ("", self.reflection[self.index])
-            c.bounding_box = pygame.Rect(0, 0, width, 0)
-            c.visible = False
-
-    def set_toppings(self):
-        """ Set spectrum toppings  """
-
-        width = self.spectrum_configs[self.index][BAR_WIDTH]
-        height = self.spectrum_configs[self.index][BAR_HEIGHT]
-        bar_gap = self.spectrum_configs[self.index][BAR_GAP]
-
-        if self.reflection == [None]:
-            n = 1
+        i = self.index
+        reflection = self.reflection[i]
+        topping = self.toppings[i]
+        atlas = self.atlases[i]
+
+        if self.tier >= TIER_NO_REFLECTIONS and reflection != None:
+            reflection = None
+            atlas = None # the atlas has reflections inside
+        if self.tier >= TIER_NO_TOPPINGS:
+            topping = None
+
+        self.bars.set_layout(self.layouts[i], self.bar[i], reflection, topping, atlas)
+
+    def set_quality(self, tier):
+        """ Switch to the quality tier selected by the governor
+
+        :param tier: quality tier
+        """
+        self.tier = tier
+        self.set_bar_surfaces()
+
+        if tier >= TIER_LOW_FRAME_RATE:
+            self.scheduler.set_frame_rate(self.config[FRAME_RATE] / 2)
         else:
-            n = 2
-
-        for r in range(self.config[SIZE]):
-            c = self.components[r + 1 + self.config[SIZE] * n]
-            origin_x = self.spectrum_configs[self.index][ORIGIN_X]
-            spectrum_x = self.spectrum_configs[self.index][SPECTRUM_X]
-            c.content_x = origin_x + spectrum_x + (r * (width + bar_gap))
-            origin_y = self.spectrum_configs[self.index][ORIGIN_Y]
-            spectrum_y = self.spectrum_configs[self.index][SPECTRUM_Y]
-            c.content_y = origin_y + spectrum_y - height
-            c.content = ("", self.toppings[self.index])
-            c.bounding_box = pygame.Rect(0, 0, width, height)
-            c.visible = False
-            c.initialized = False
+            self.scheduler.set_frame_rate(self.config[FRAME_RATE])
+
+        self.full_redraw = True
 
     def set_foreground(self):
         """ Set foreground image """
@@ -473,32 +692,27 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
     def refresh(self):
         """ Update spectrum """
         
-        self.test_iterator = 0
-        self.index = next(self.indexes)
-        self.init_variables()
+        self.index = self.next_index
+        self.next_index = next(self.indexes)
+        self.load_layout(self.index)
         self.set_background()
         self.set_bars()
-        self.set_reflections()
-        self.set_toppings()
         self.set_foreground()
+        self.full_redraw = True
+        self.prefetch_layout()
 
-    def init_variables(self):
-        """ Init variables for new spectrum """
-
-        self.height = self.spectrum_configs[self.index][BAR_HEIGHT]
-        self.step = int(self.height / self.spectrum_configs[self.index][STEPS])
-        self.origin_y = self.spectrum_configs[self.index][ORIGIN_Y]
-        self.spectrum_y = self.spectrum_configs[self.index][SPECTRUM_Y]
-        self.unit = self.height / self.config[MAX_VALUE]
-        self.topping_height = self.spectrum_configs[self.index][TOPPING_HEIGHT]
-        self.topping_step = self.spectrum_configs[self.index][TOPPING_STEP]
-            
     def stop(self):
         """ Stop spectrum thread. """ 
         
         self.run_flag = False
         self.run_datasource = False
-        self.seconds = 0
+
+        if self.prefetch_timer:
+            self.prefetch_timer.cancel()
+
+        if self.worker:
+            self.worker.stop()
+            self.worker = None
 
         if hasattr(self, "callback_stop"):
             self.callback_stop(self)
@@ -509,7 +723,7 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
     def start_data_source(self):
         """ Start data source thread. """
 
-        self.flush_pipe_buffer()
+        self.flush_data_source()
         self.run_datasource = True
         thread = Thread(target=self.get_data)
         thread.start()
@@ -519,20 +733,25 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
                
         while self.run_datasource:
             self.set_values()
-            time.sleep(self.config[UPDATE_UI_INTERVAL])
+            if self.windows or not self.data_source.is_open():
+                time.sleep(self.config[UPDATE_UI_INTERVAL])
     
-    def get_latest_pipe_data(self):
-        """ Read from the named pipe until it's empty """
+    def get_latest_data(self, timeout):
+        """ Wait for the next frame from the data source.
+        If there was no frame during two update intervals the silence frame is returned.
 
-        data = [0] * self.config[PIPE_SIZE]
-        while True:
-            try:
-                tmp_data = os.read(self.pipe, self.config[PIPE_SIZE])
-                if len(tmp_data) == self.config[PIPE_SIZE]:
-                    data = tmp_data
-                time.sleep(self.config[PIPE_POLLING_INTERVAL])
-            except:
-                break
+        :param timeout: maximum waiting time in seconds
+
+        :return: the newest frame or None
+        """
+        interval = self.config[UPDATE_UI_INTERVAL]
+        data = self.data_source.read(timeout)
+        now = time.monotonic()
+
+        if data != None:
+            self.frame_time = now
+        elif now - self.frame_time > 2 * interval:
+            data = bytes(4 * self.config[SIZE])
 
         return data
 
@@ -545,143 +764,206 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
         mask = 0b11111111
         test_data = None
 
-        if self.config[USE_TEST_DATA]:
+        if self.test_frames:
+            test_data = next(self.test_frames)
+        elif self.config[USE_TEST_DATA]:
             test_data = TEST_DATA[self.config[USE_TEST_DATA]]
 
         for n in range(self.config[SIZE]):
             if test_data == None:
                 v = int((randrange(0, int(self.config[MAX_VALUE]))))
             else:
-                if len(test_data) == 8:
-                    v = test_data[self.test_iterator][n]
-                else:
-                    v = test_data[n]
+                v = test_data[n]
 
             data.append(v & mask)
             data.append((v >> 8) & mask)
             data.append((v >> 16) & mask)
             data.append((v >> 24) & mask)
 
-        if test_data and len(test_data) == 8:
-            if self.test_iterator == len(test_data) - 1:
-                self.test_iterator = 0
-            else:
-                self.test_iterator += 1
+        return bytes(data)
 
-        return data
+    def set_values(self, timeout=None):
+        """ Get signal from the data source and update spectrum bars.
+        
+        :param timeout: maximum waiting time for the data in seconds, None - update UI interval
+        """ 
 
-    def set_values(self):
-        """ Get signal from the named pipe and update spectrum bars. """ 
+        if self.worker:
+            self.set_worker_values(0)
+            return
 
-        data = []
+        data = None
+
+        if timeout == None:
+            timeout = self.config[UPDATE_UI_INTERVAL]
 
-        if self.windows:
+        if self.windows and self.config[DATA_SOURCE] != "replay":
             data = self.get_test_data()
         else:
             try:
-                if self.pipe == None:
-                    return
-    			
-                data = self.get_latest_pipe_data()
+                data = self.get_latest_data(timeout)
             except Exception as e:
                 logging.debug(e)
                 return
 
-        length = len(data)
-        if length == 0:
+        if not data:
             return
-            
-        words = int(length / 4)
 
-        for m in range(words):
-            v = data[4 * m] + (data[4 * m + 1] << 8) + (data[4 * m + 2] << 16) + (data[4 * m + 3] << 24)
-            v = v * self.unit
+        index = self.index
+        try:
+            heights = self.get_heights(data, self.layouts[index])
+        except Exception as e:
+            logging.debug(e)
+            return
 
-            if v <= 0:
-                steps = 0
-            elif v % self.step == 0:
-                steps = int(v / self.step)
-            else:
-                steps = int(v / self.step) + 1
-            
-            new_height = steps * self.step * self.height_adjuster
-            i = m + 1
-            
-            self.set_bar_y(i, new_height)
-            self.set_reflection_y(i, new_height)
-            self.set_topping_y(i, new_height)
-
-    def set_bar_y(self, index, new_height):
-        """ Set bar Y coordinate
-
-        :param index: element index
-        :param new_height: element new height
-        """
-        comp = self.components[index]
-        comp.bounding_box.h = new_height
-        comp.bounding_box.y = self.height - new_height
-        comp.content_y = int(self.spectrum_y + self.origin_y - new_height)
-        comp.visible = True
+        if heights is None:
+            logging.debug(f"Invalid frame dropped, size: {len(data)}")
+            return
 
-    def set_reflection_y(self, index, new_height):
-        """ Set reflection Y coordinate
+        self.publish(heights, index)
 
-        :param index: element index
-        :param new_height: element new height
+    def get_heights(self, data, layout):
+        """ Decode frame and quantize all bar heights in one pass
+
+        :param data: legacy or compact frame bytes
+        :param layout: the layout defining bar height and quantization step
+
+        :return: numpy array with bar heights or None if the frame is invalid
         """
-        if self.reflection == [None]:
-            return
+        values = self.frame_decoder.decode(data)
+        if values is None:
+            return None
+
+        return layout.quantize(values) * self.height_adjuster
 
-        comp = self.components[index + self.config[SIZE]]
-        comp.bounding_box.h = new_height
-        comp.bounding_box.y = 0
-        comp.content_y = int(self.spectrum_y + self.origin_y + self.reflection_gap)
-        comp.visible = True
+    def update_bars(self):
+        """ Update bars from the newest published frame. Called by the render thread. """
 
-    def set_topping_y(self, index, new_height):
-        """ Set topping Y coordinate
+        frame = self.frame_buffer.get_front()
+        if frame != None and frame.sequence != self.frame_sequence:
+            self.frame_sequence = frame.sequence
+            if frame.index == self.index:
+                if self.interpolator:
+                    self.interpolator.set_target(frame.heights[:frame.count])
+                else:
+                    self.dynamics.set_target(frame.heights[:frame.count])
+
+        if self.interpolator and self.interpolator.is_active():
+            self.dynamics.set_target(self.interpolator.next())
+
+        now = time.monotonic()
+        self.dynamics.update(now - self.dynamics_time)
+        self.dynamics_time = now
+
+        n = self.dynamics.count
+        if n == 0:
+            return
 
-        :param index: element index
-        :param new_height: element new height
+        if self.tier >= TIER_COARSE_STEPS:
+            step = 2 * self.layouts[self.index].step
+            self.bars.update(np.floor(self.dynamics.level[:n] / step) * step, np.floor(self.dynamics.peak[:n] / step) * step, self.dynamics.pushed[:n])
+        else:
+            self.bars.update(self.dynamics.level[:n], self.dynamics.peak[:n], self.dynamics.pushed[:n])
+
+    def clean_draw_update(self):
+        """ Clean, draw and update spectrum. 
+        In dirty rectangles mode only the changed columns are redrawn and updated.
         """
-        if self.topping_height == None or self.topping_step == None:
+        self.update_bars()
+
+        if not self.dirty_rectangles or self.full_redraw:
+            self.full_redraw = False
+            SpectrumContainer.clean_draw_update(self)
+            self.bars.get_dirty_columns()
             return
 
-        n = 1
-        if self.reflection != [None]:
-            n = 2
-
-        m = index + self.config[SIZE] * n
-        comp = self.components[m]
-        comp.bounding_box.h = self.topping_height
-        y_0 = self.spectrum_y + self.origin_y
-        c_y = int(y_0 - new_height)
-        if c_y >= y_0:
-            c_y = y_0
-
-        if not comp.initialized:
-            comp.content_y = c_y
-            comp.initialized = True
+        columns = self.bars.get_dirty_columns()
+        if len(columns) == 0:
             return
 
-        if c_y > comp.content_y + self.topping_step + self.topping_height:
-            comp.content_y += self.topping_step
-            comp.bounding_box.y = self.height - (y_0 - comp.content_y) + 1
-            comp.visible = True
-        else:
-            comp.content_y = c_y - self.topping_height - self.topping_step
-            comp.visible = False
+        rects = self.bars.get_column_rects(columns, self.bounding_box)
+        for r in rects:
+            self.draw_area(r)
 
-    def update_ui(self):
-        """ Update UI Thread method. """ 
+        blits = []
+        self.components[0].add_area_blits(blits, rects)
+        self.bars.add_blits(blits, columns)
+        self.components[-1].add_area_blits(blits, rects)
+        self.flush_blits(blits)
+        self.update_rectangle(rects)
 
-        while self.run_flag:
+    def set_worker_values(self, timeout=0):
+        """ Take the newest bar heights prepared by the worker process
+
+        :param timeout: maximum waiting time for the new heights in seconds
+        """
+        self.worker.set_index(self.index)
+        deadline = time.monotonic() + timeout
+        frame = self.worker.read()
+        while frame == None and time.monotonic() < deadline:
             time.sleep(self.config[UPDATE_UI_INTERVAL])
+            frame = self.worker.read()
+
+        if frame:
+            heights, index = frame
+            self.publish(heights, index)
+
+    def publish(self, heights, index):
+        """ Hand bar heights to the render thread and remember the time of the last non-zero bars
+
+        :param heights: array of bar heights
+        :param index: the layout index used for the heights
+        """
+        if heights.any():
+            self.active_time = time.monotonic()
+        self.frame_buffer.publish(heights, index)
+
+    def is_idle(self):
+        """ Check if all bars were at zero longer than idle timeout and the drawn bars settled
+
+        :return: True - idle, False - active
+        """
+        timeout = self.config[IDLE_TIMEOUT]
+        if timeout <= 0 or time.monotonic() - self.active_time < timeout:
+            return False
+
+        if self.interpolator and self.interpolator.is_active():
+            return False
+
+        return not self.dynamics.level.any() and not self.dynamics.peak.any()
+
+    def wait_idle(self):
+        """ Block on the data source without drawing until non-zero data arrives """
+
+        if self.worker:
+            self.set_worker_values(IDLE_POLL_INTERVAL)
+        else:
+            self.set_values(IDLE_POLL_INTERVAL)
+
+        if time.monotonic() - self.active_time < self.config[IDLE_TIMEOUT]:
+            logging.debug("Spectrum active")
+            self.idle = False
+            self.dynamics_time = time.monotonic()
+            self.refresh_time = time.monotonic()
+            self.scheduler.start()
+            if self.governor:
+                self.governor.reset()
+
+    def render_frame(self):
+        """ Read the newest data and draw one frame """
+
+        self.set_values(0)
+        self.clean_draw_update()
 
     def start_display_output(self):
-        """ Start main loop in standalone mode """
+        """ Start main loop in standalone mode.
+        Each frame reads the newest data, updates bars and presents them on the frame rate deadline.
+        After idle timeout with all bars at zero nothing is drawn until non-zero data arrives.
+        """
 
         pygame.event.clear()
+        self.refresh_time = time.monotonic()
+        self.scheduler.start()
         while self.run_flag:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -692,16 +974,39 @@ class Spectrum(SpectrumContainer, ScreensaverSpectrum):
                         self.exit()
                 elif event.type == pygame.MOUSEBUTTONUP and self.config[EXIT_ON_TOUCH]:
                     self.exit()
-            if self.seconds >= self.config[UPDATE_PERIOD]:
-                self.seconds = 0
+            if self.idle:
+                self.wait_idle()
+                if self.stats:
+                    self.stats.skip_frame()
+                continue
+            if time.monotonic() - self.refresh_time >= self.config[UPDATE_PERIOD]:
+                self.refresh_time = time.monotonic()
                 self.refresh()
-            self.seconds += 0.1
-            time.sleep(0.1)
-            self.clean_draw_update()
+            render_start = time.monotonic()
+            self.render_frame()
+            if self.stats:
+                self.stats.end_frame()
+            if self.governor:
+                tier = self.governor.update(time.monotonic() - render_start, self.scheduler.period)
+                if tier != None:
+                    self.set_quality(tier)
+            if self.is_idle():
+                logging.debug("Spectrum idle")
+                self.idle = True
+                continue
+            self.scheduler.wait()
 
     def exit(self):
         """ Exit program """
 
+        if self.worker:
+            self.worker.stop() # the worker closes its data source
+        else:
+            self.data_source.close() # writes the rest of the recording
+
+        if self.framebuffer_device:
+            self.framebuffer_device.close()
+
         pygame.quit()
 
         if hasattr(self, "malloc_trim"):
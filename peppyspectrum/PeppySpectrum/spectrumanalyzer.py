@@ -0,0 +1,242 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import select
+import logging
+import numpy as np
+
+from spectrumframe import encode_frame
+
+PCM_FORMATS = {"S16_LE": "<i2", "S32_LE": "<i4"}
+MIN_FREQUENCY = 20
+MAX_FREQUENCY = 20000
+FLOOR_DB = -60.0
+OPEN_RETRY_INTERVAL = 1.0
+
+class SpectrumAnalyzer(object):
+    """ In-process spectrum analyzer data source.
+    Reads raw PCM from the named pipe, runs windowed FFT over the sliding buffer
+    and maps FFT bins to logarithmically spaced bands. Returns compact spectrum frames.
+    """
+
+    def __init__(self, name, pcm_format, rate, channels, fft_size, size, max_value):
+        """ Initializer
+
+        :param name: the path of the named pipe with raw PCM
+        :param pcm_format: sample format S16_LE or S32_LE
+        :param rate: sample rate
+        :param channels: the number of interleaved channels
+        :param fft_size: the number of samples in the FFT window
+        :param size: the number of bands
+        :param max_value: the value of the full scale band
+        """
+        self.name = name
+        self.pipe = None
+        self.open_time = time.monotonic()
+        self.open_failed = False
+        self.poller = select.poll()
+        self.sample_type = np.dtype(PCM_FORMATS.get(pcm_format, PCM_FORMATS["S16_LE"]))
+        self.channels = channels
+        self.frame_bytes = self.sample_type.itemsize * channels
+        self.full_scale = float(2 ** (self.sample_type.itemsize * 8 - 1))
+        self.fft_size = fft_size
+        self.size = size
+        self.max_value = max_value
+        self.width = 1 if max_value <= 0xFF else 2
+        self.sequence = 0
+        self.pending = b""
+        self.reads = 0
+        self.bytes = 0
+
+        self.samples = np.zeros(fft_size, dtype=np.float32)
+        self.window = np.hanning(fft_size).astype(np.float32)
+        self.window_gain = self.window.sum() / 2 # magnitude of the full scale sine
+        self.band_starts, self.bins = self.get_band_tables(rate, fft_size, size)
+
+    def get_band_tables(self, rate, fft_size, size):
+        """ Prepare FFT bin index tables for logarithmically spaced bands.
+        Band starts are strictly increasing and within the FFT bins. If there are more bands than bins,
+        the top bands start at the last bin.
+
+        :param rate: sample rate
+        :param fft_size: FFT window size
+        :param size: the number of bands
+
+        :return: tuple (array of the first bin of each band, the number of used bins)
+        """
+        bin_width = rate / fft_size
+        max_frequency = min(MAX_FREQUENCY, rate / 2)
+        edges = np.geomspace(MIN_FREQUENCY, max_frequency, size + 1)
+        bins = np.round(edges / bin_width).astype(np.int64)
+        starts = bins[:-1].copy()
+        fft_bins = int(fft_size / 2) + 1
+
+        for i in range(1, size):
+            starts[i] = max(starts[i], starts[i - 1] + 1) # at least one bin per band
+        for i in range(size):
+            starts[i] = min(starts[i], fft_bins - size + i) # leave one bin for each band above
+        starts = np.clip(starts, 0, fft_bins - 1)
+        used = max(int(bins[-1]), int(starts[-1]) + 1)
+
+        return starts, min(used, fft_bins)
+
+    def is_open(self):
+        """ Check if the named pipe is open
+
+        :return: True - open, False - not open
+        """
+        return self.pipe != None
+
+    def open(self):
+        """ Open named pipe with PCM """
+
+        self.open_time = time.monotonic()
+        try:
+            self.pipe = os.open(self.name, os.O_RDONLY | os.O_NONBLOCK)
+            self.poller.register(self.pipe, select.POLLIN)
+            self.open_failed = False
+        except Exception as e:
+            if not self.open_failed:
+                logging.debug("Cannot open named pipe: " + self.name)
+                logging.debug(e)
+            self.open_failed = True
+
+    def reopen(self):
+        """ Reopen named pipe after the writer has gone """
+
+        self.close()
+        self.open()
+
+    def retry_open(self, timeout):
+        """ Try to open the missing named pipe again, wait if it's still missing
+
+        :param timeout: waiting time in seconds
+
+        :return: True - the pipe is open, False - the pipe is still missing
+        """
+        if time.monotonic() - self.open_time >= OPEN_RETRY_INTERVAL:
+            self.open()
+
+        if self.pipe == None:
+            time.sleep(timeout)
+            return False
+
+        return True
+
+    def close(self):
+        """ Close named pipe """
+
+        if self.pipe == None:
+            return
+
+        try:
+            self.poller.unregister(self.pipe)
+            os.close(self.pipe)
+        except Exception as e:
+            logging.debug(e)
+
+        self.pipe = None
+
+    def flush(self):
+        """ Discard PCM available in the pipe and clear the sliding buffer """
+
+        self.drain()
+        self.pending = b""
+        self.samples[:] = 0
+
+    def drain(self):
+        """ Read all available PCM
+
+        :return: bytes read from the pipe
+        """
+        if self.pipe == None:
+            return b""
+
+        chunks = []
+        while True:
+            try:
+                chunk = os.read(self.pipe, 65536)
+            except BlockingIOError:
+                break
+            except Exception as e:
+                logging.debug(e)
+                break
+            self.reads += 1
+            if not chunk:
+                break
+            self.bytes += len(chunk)
+            chunks.append(chunk)
+
+        return b"".join(chunks)
+
+    def add_samples(self, data):
+        """ Append PCM to the sliding buffer. Only the newest FFT window of the PCM is converted,
+        the older PCM e.g. accumulated in the pipe during the stall is skipped.
+
+        :param data: raw interleaved PCM
+        """
+        data = self.pending + data
+        usable = len(data) - len(data) % self.frame_bytes
+        self.pending = data[usable:]
+
+        start = max(0, usable - self.fft_size * self.frame_bytes)
+        pcm = np.frombuffer(data, dtype=self.sample_type, count=int((usable - start) / self.sample_type.itemsize), offset=start)
+        mono = pcm.reshape(-1, self.channels).mean(axis=1, dtype=np.float32)
+        n = len(mono)
+        if n == 0:
+            return
+        if n < self.fft_size:
+            self.samples[:-n] = self.samples[n:]
+        self.samples[-n:] = mono / self.full_scale
+
+    def get_values(self):
+        """ Run FFT over the sliding buffer and map bins to bands
+
+        :return: array of band values from 0 to max value
+        """
+        magnitudes = np.abs(np.fft.rfft(self.samples * self.window))[:self.bins]
+        bands = np.maximum.reduceat(magnitudes, self.band_starts) / self.window_gain
+        db = 20 * np.log10(np.maximum(bands, 1e-9))
+        values = (db - FLOOR_DB) / -FLOOR_DB * self.max_value
+
+        return np.clip(values, 0, self.max_value)
+
+    def read(self, timeout=0):
+        """ Wait for PCM and return the spectrum of the newest samples
+
+        :param timeout: maximum waiting time in seconds
+
+        :return: compact spectrum frame or None if there was no new PCM
+        """
+        if self.pipe == None and not self.retry_open(timeout):
+            return None
+
+        if not self.poller.poll(int(timeout * 1000)):
+            return None
+
+        data = self.drain()
+        if len(self.pending) + len(data) < self.frame_bytes:
+            if not data:
+                self.reopen() # no writer, poll doesn't block
+            return None
+
+        self.add_samples(data)
+        self.sequence += 1
+
+        return encode_frame(self.get_values(), self.sequence, self.width)
@@ -0,0 +1,80 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import pygame
+import numpy as np
+
+class SpectrumAtlas(object):
+    """ Sprite atlas with pre-rendered bar columns.
+    The atlas has one strip per quantization step, each strip contains the bar and its reflection.
+    """
+
+    def __init__(self, layout, bar, reflection):
+        """ Initializer
+
+        :param layout: the layout geometry
+        :param bar: bar surface
+        :param reflection: reflection surface or None
+        """
+        w = self.bar_width = layout.bar_width
+        h = self.bar_height = layout.bar_height
+        step = self.step = layout.step
+        self.levels = int(math.ceil(h / step))
+        self.reflection = reflection != None
+
+        if self.reflection:
+            self.reflection_offset = h + layout.reflection_y - layout.base_y
+            strip_h = max(h, self.reflection_offset + h)
+        else:
+            self.reflection_offset = h
+            strip_h = h
+
+        self.surface = pygame.Surface(((self.levels + 1) * w, strip_h), pygame.SRCALPHA, 32)
+
+        for level in range(self.levels + 1):
+            bar_h = min(level * step, h)
+            x = level * w
+            self.surface.blit(bar, (x, h - bar_h), (0, h - bar_h, w, bar_h), pygame.BLEND_RGBA_MAX)
+            if self.reflection:
+                self.surface.blit(reflection, (x, self.reflection_offset), (0, 0, w, bar_h), pygame.BLEND_RGBA_MAX)
+
+        self.memory = self.surface.get_width() * self.surface.get_height() * self.surface.get_bytesize()
+
+    def get_blits(self, x, heights, base_y):
+        """ Prepare one blit per column
+
+        :param x: array of column X coordinates
+        :param heights: array of bar heights
+        :param base_y: the Y coordinate of the bars bottom
+
+        :return: list of (surface, dest, area) tuples
+        """
+        w = self.bar_width
+        h = self.bar_height
+        levels = np.minimum(np.ceil(heights / self.step).astype(np.int32), self.levels) # rounded up like in get_heights
+        bar_h = np.minimum(levels * self.step, h)
+
+        if self.reflection:
+            area_h = self.reflection_offset - h + 2 * bar_h
+        else:
+            area_h = bar_h
+
+        surface = self.surface
+
+        return [(surface, (col_x, base_y - col_h), (level * w, h - col_h, w, col_area_h))
+            for col_x, col_h, level, col_area_h in zip(x.tolist(), bar_h.tolist(), levels.tolist(), area_h.tolist())]
@@ -0,0 +1,240 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import pygame
+import numpy as np
+
+from spectrumcomponent import SpectrumComponent
+from spectrumconfigparser import *
+
+class SpectrumLayout(object):
+    """ Bar geometry of one spectrum configuration """
+
+    def __init__(self, config, size, max_value):
+        """ Initializer
+
+        :param config: spectrum configuration (section of the spectrum.txt)
+        :param size: the number of bars
+        :param max_value: the maximum value of the data
+        """
+        self.bar_width = config[BAR_WIDTH]
+        self.bar_height = config[BAR_HEIGHT]
+        self.step = int(self.bar_height / config[STEPS])
+        self.unit = self.bar_height / max_value
+        self.x = config[ORIGIN_X] + config[SPECTRUM_X] + np.arange(size, dtype=np.int32) * (self.bar_width + config[BAR_GAP])
+        self.base_y = config[ORIGIN_Y] + config[SPECTRUM_Y]
+        self.reflection_y = self.base_y + (config.get(REFLECTION_GAP, 0) or 0)
+        self.topping_height = config[TOPPING_HEIGHT]
+        self.topping_step = config[TOPPING_STEP]
+        self.topping_mode = config.get(TOPPING_MODE, "step")
+        self.attack = config[ATTACK] / 1000
+        self.release = config[RELEASE] / 1000
+        self.peak_hold = config[PEAK_HOLD] / 1000
+        self.peak_fall = config[PEAK_FALL]
+
+        top = self.base_y - self.bar_height
+        if self.topping_height != None and self.topping_step != None:
+            top -= 2 * (self.topping_height + self.topping_step)
+        if config.get(REFLECTION_TYPE, None):
+            bottom = self.reflection_y + self.bar_height
+        else:
+            bottom = self.base_y
+        self.column_top = top
+        self.column_height = bottom - top
+
+    def quantize(self, values):
+        """ Convert data values to bar heights rounded up to the whole steps
+
+        :param values: array of data values
+
+        :return: array of bar heights
+        """
+        return np.ceil(values * self.unit / self.step) * self.step
+
+class SpectrumBars(SpectrumComponent):
+    """ Struct-of-arrays model of the spectrum bars, reflections and toppings.
+    Keeps the state of all bars in contiguous arrays and draws them as one component.
+    """
+
+    def __init__(self, util, size):
+        """ Initializer
+
+        :param util: utility object
+        :param size: the number of bars
+        """
+        SpectrumComponent.__init__(self, util)
+        self.size = size
+        self.layout = None
+        self.bar = self.reflection = self.topping = None
+        self.atlas = None
+
+        self.x = np.zeros(size, dtype=np.int32)
+        self.bar_y = np.zeros(size, dtype=np.int32)
+        self.bar_h = np.zeros(size, dtype=np.int32)
+        self.bar_visible = np.zeros(size, dtype=bool)
+        self.reflection_visible = np.zeros(size, dtype=bool)
+        self.topping_y = np.zeros(size, dtype=np.int32)
+        self.topping_area_y = np.zeros(size, dtype=np.int32)
+        self.topping_visible = np.zeros(size, dtype=bool)
+        self.state = np.zeros((6, size), dtype=np.int32)
+        self.drawn_state = np.zeros((6, size), dtype=np.int32)
+
+    def set_layout(self, layout, bar, reflection, topping, atlas=None):
+        """ Switch to the new layout and hide all bars
+
+        :param layout: the layout geometry
+        :param bar: bar surface
+        :param reflection: reflection surface or None
+        :param topping: topping surface or None
+        :param atlas: pre-rendered bar columns or None
+        """
+        self.layout = layout
+        self.bar = bar
+        self.reflection = reflection
+        self.atlas = atlas
+        if layout.topping_height == None or layout.topping_step == None:
+            self.topping = None
+        else:
+            self.topping = topping
+
+        self.x[:] = layout.x
+        self.bar_y[:] = layout.base_y - layout.bar_height
+        self.bar_h[:] = layout.bar_height
+        self.bar_visible[:] = False
+        self.reflection_visible[:] = False
+        self.topping_y[:] = layout.base_y - layout.bar_height
+        self.topping_area_y[:] = 0
+        self.topping_visible[:] = False
+
+    def update(self, heights, peaks=None, pushed=None):
+        """ Set new bar heights and peaks
+
+        :param heights: array of bar heights
+        :param peaks: array of peak heights for toppings
+        :param pushed: array of flags, True - the peak was pushed up by the bar in the last update
+        """
+        if self.layout == None:
+            return
+
+        n = min(len(heights), self.size)
+        h = heights[:n].astype(np.int32)
+        y_0 = self.layout.base_y
+
+        self.bar_h[:n] = h
+        self.bar_y[:n] = y_0 - h
+        self.bar_visible[:n] = True
+
+        if self.reflection:
+            self.reflection_visible[:n] = True
+
+        if self.topping and peaks is not None:
+            p = peaks[:n].astype(np.int32)
+            if self.layout.topping_mode == "peak":
+                top = p + self.layout.topping_height # on the peak, visible above zero
+                self.topping_visible[:n] = p > 0
+            else:
+                top = p + self.layout.topping_height + self.layout.topping_step # one step above the peak, hidden when pushed
+                self.topping_visible[:n] = p > h if pushed is None else ~pushed[:n]
+            self.topping_y[:n] = y_0 - top
+            self.topping_area_y[:n] = np.maximum(self.layout.bar_height - top + 1, 0)
+
+    def draw(self):
+        """ Draw bars, reflections and toppings """
+
+        blits = []
+        self.add_blits(blits)
+        self.flush_blits(blits)
+
+    def add_blits(self, blits, columns=None):
+        """ Add bars, reflections and toppings to the batch of blits
+
+        :param blits: list of (surface, dest, area) tuples
+        :param columns: indexes of the columns to add, None - all columns
+        """
+        if not self.visible or self.layout == None:
+            return
+
+        w = self.layout.bar_width
+        h = self.layout.bar_height
+
+        if columns is None:
+            bar_visible = self.bar_visible
+            reflection_visible = self.reflection_visible
+            topping_visible = self.topping_visible
+        else:
+            selected = np.zeros(self.size, dtype=bool)
+            selected[columns] = True
+            bar_visible = self.bar_visible & selected
+            reflection_visible = self.reflection_visible & selected
+            topping_visible = self.topping_visible & selected
+
+        if self.atlas:
+            i = np.flatnonzero(bar_visible)
+            blits.extend(self.atlas.get_blits(self.x[i], self.bar_h[i], self.layout.base_y))
+        elif self.bar:
+            i = np.flatnonzero(bar_visible)
+            bar = self.bar
+            blits.extend([(bar, (x, y), (0, h - bar_h, w, bar_h))
+                for x, y, bar_h in zip(self.x[i].tolist(), self.bar_y[i].tolist(), self.bar_h[i].tolist())])
+
+        if self.reflection and not self.atlas:
+            i = np.flatnonzero(reflection_visible)
+            reflection = self.reflection
+            y = self.layout.reflection_y
+            blits.extend([(reflection, (x, y), (0, 0, w, bar_h))
+                for x, bar_h in zip(self.x[i].tolist(), self.bar_h[i].tolist())])
+
+        if self.topping:
+            i = np.flatnonzero(topping_visible)
+            topping = self.topping
+            th = self.layout.topping_height
+            blits.extend([(topping, (x, y), (0, area_y, w, th))
+                for x, y, area_y in zip(self.x[i].tolist(), self.topping_y[i].tolist(), self.topping_area_y[i].tolist())])
+
+    def get_dirty_columns(self):
+        """ Compare bars with the last drawn state and remember the current state
+
+        :return: indexes of the columns which changed since the last call
+        """
+        state = self.state
+        state[0] = self.bar_h
+        state[1] = self.bar_visible
+        state[2] = self.reflection_visible
+        state[3] = self.topping_y
+        state[4] = self.topping_area_y
+        state[5] = self.topping_visible
+        columns = np.flatnonzero((state != self.drawn_state).any(axis=0))
+        self.drawn_state[:] = state
+
+        return columns
+
+    def get_column_rects(self, columns, clip):
+        """ Get screen rectangles covered by the columns
+
+        :param columns: column indexes
+        :param clip: the screen rectangle
+
+        :return: list of column rectangles
+        """
+        if self.layout == None:
+            return []
+
+        w = self.layout.bar_width
+        top = self.layout.column_top
+        h = self.layout.column_height
+
+        return [pygame.Rect(x, top, w, h).clip(clip) for x in self.x[columns].tolist()]
@@ -0,0 +1,293 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import argparse
+import multiprocessing
+import numpy as np
+
+from configparser import ConfigParser
+from spectrumrecording import SpectrumReplay, is_recording
+
+BENCHMARK_FOLDERS = ["320x240", "480x320", "800x480", "1280x400"]
+BENCHMARK_FRAMES = 500
+BENCHMARK_SEED = 1
+PHASES = ["decode", "update", "blit", "present"]
+
+class SpectrumPhaseTimer(object):
+    """ Accumulates time spent in the wrapped methods of the spectrum """
+
+    def __init__(self):
+        """ Initializer """
+
+        self.times = dict.fromkeys(PHASES, 0.0)
+
+    def wrap(self, phase, function):
+        """ Create the function which adds its execution time to the phase
+
+        :param phase: the phase name
+        :param function: the function to measure
+
+        :return: the measured function
+        """
+        def timed(*args):
+            start = time.perf_counter()
+            result = function(*args)
+            self.times[phase] += time.perf_counter() - start
+            return result
+
+        return timed
+
+def get_templates(base_folder, folders):
+    """ Find all templates in the spectrum folders
+
+    :param base_folder: the folder with spectrum folders
+    :param folders: the list of spectrum folder names
+
+    :return: list of (folder, template) tuples
+    """
+    from spectrumconfigparser import FILE_SPECTRUM_CONFIG
+
+    templates = []
+    for folder in folders:
+        c = ConfigParser()
+        c.read(os.path.join(base_folder, folder, FILE_SPECTRUM_CONFIG))
+        templates.extend((folder, section) for section in c.sections())
+
+    return templates
+
+def write_config(config_path, folder, template, base_folder, work_folder):
+    """ Write configuration file which runs only one template without the data source and the caches
+
+    :param config_path: the source config.txt
+    :param folder: the spectrum folder name
+    :param template: the template name
+    :param base_folder: the folder with spectrum folders
+    :param work_folder: the folder for the new config.txt
+    """
+    from spectrumconfigparser import CURRENT, SPECTRUM, BASE_FOLDER, SPECTRUM_FOLDER, PIPE_NAME, DATA_SOURCE, \
+        MULTIPROCESS, IDLE_TIMEOUT, QUALITY_GOVERNOR, ASSET_CACHE_FOLDER, OUTPUT, USE_LOGGING, FILE_CONFIG
+
+    c = ConfigParser()
+    c.read(config_path)
+    c.set(CURRENT, SPECTRUM, template)
+    c.set(CURRENT, BASE_FOLDER, base_folder)
+    c.set(CURRENT, SPECTRUM_FOLDER, folder)
+    c.set(CURRENT, DATA_SOURCE, "pipe")
+    c.set(CURRENT, PIPE_NAME, os.path.join(work_folder, "missing_fifo")) # frames are fed directly
+    c.set(CURRENT, MULTIPROCESS, "False")
+    c.set(CURRENT, IDLE_TIMEOUT, "0")
+    c.set(CURRENT, QUALITY_GOVERNOR, "False")
+    c.set(CURRENT, ASSET_CACHE_FOLDER, "")
+    c.set(CURRENT, OUTPUT, "sdl")
+    c.set(CURRENT, USE_LOGGING, "False")
+
+    with open(os.path.join(work_folder, FILE_CONFIG), "w") as f:
+        c.write(f)
+
+def get_synthetic_frames(count, size, max_value, frame_format, width):
+    """ Create random frames in the configured frame format
+
+    :param count: the number of frames
+    :param size: the number of bands
+    :param max_value: the maximum band value
+    :param frame_format: legacy or compact
+    :param width: value width of the compact frames in bytes
+
+    :return: list of frame bytes
+    """
+    from spectrumframe import encode_frame
+
+    random.seed(BENCHMARK_SEED)
+    frames = []
+    for n in range(count):
+        values = [random.randrange(0, int(max_value)) for _ in range(size)]
+        if frame_format == "compact":
+            frames.append(encode_frame(values, n, width))
+        else:
+            frames.append(np.array(values, dtype="<u4").tobytes())
+
+    return frames
+
+def get_recorded_frames(path, count, frame_size):
+    """ Read recorded frames, repeat them if the recording is shorter than the benchmark.
+    The file is either the recording made with record.file or consecutive raw frames captured from the named pipe.
+
+    :param path: the recording or the file with raw frames
+    :param count: the number of frames
+    :param frame_size: the size of one raw frame in bytes
+
+    :return: list of frame bytes
+    """
+    if is_recording(path):
+        replay = SpectrumReplay(path, realtime=False, loop=True)
+        replay.open()
+        if replay.frames == None:
+            raise ValueError(f"Invalid recording: {path}")
+        return [replay.read() for _ in range(count)]
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    recorded = [data[n : n + frame_size] for n in range(0, len(data) - frame_size + 1, frame_size)]
+    if len(recorded) == 0:
+        raise ValueError(f"No frames in the file: {path}")
+
+    return [recorded[n % len(recorded)] for n in range(count)]
+
+def run_template(config_path, folder, template, base_folder, frame_count, recording, results):
+    """ Render the template for the fixed number of frames. Runs in a separate process to measure its peak memory.
+
+    :param config_path: the source config.txt
+    :param folder: the spectrum folder name
+    :param template: the template name
+    :param base_folder: the folder with spectrum folders
+    :param frame_count: the number of frames to render
+    :param recording: the file with recorded frames, None - synthetic frames
+    :param results: the queue for the results
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    work_folder = tempfile.mkdtemp(prefix="peppy_spectrum_benchmark_")
+    write_config(config_path, folder, template, base_folder, work_folder)
+    os.chdir(work_folder)
+
+    from spectrum import Spectrum
+    from spectrumconfigparser import SIZE, MAX_VALUE, FRAME_FORMAT, FRAME_VALUE_WIDTH, PIPE_SIZE
+
+    load_start = time.perf_counter()
+    spectrum = Spectrum(None, True)
+    spectrum.start()
+    load_time = time.perf_counter() - load_start
+
+    config = spectrum.config
+    if recording:
+        frames = get_recorded_frames(recording, frame_count, config[PIPE_SIZE])
+    else:
+        frames = get_synthetic_frames(frame_count, config[SIZE], config[MAX_VALUE], config[FRAME_FORMAT], config[FRAME_VALUE_WIDTH])
+
+    timer = SpectrumPhaseTimer()
+    get_heights = timer.wrap("decode", spectrum.get_heights)
+    spectrum.update_bars = timer.wrap("update", spectrum.update_bars)
+    spectrum.update = timer.wrap("present", spectrum.update)
+    spectrum.update_rectangle = timer.wrap("present", spectrum.update_rectangle)
+
+    period = spectrum.scheduler.period
+    layout = spectrum.layouts[spectrum.index]
+    frame_times = np.zeros(frame_count)
+    draw_time = 0
+
+    for n, data in enumerate(frames):
+        spectrum.dynamics_time = time.monotonic() - period # bars move as on the real frame rate
+        start = time.perf_counter()
+        heights = get_heights(data, layout)
+        if heights is not None:
+            spectrum.publish(heights, spectrum.index)
+        draw_start = time.perf_counter()
+        spectrum.clean_draw_update()
+        end = time.perf_counter()
+        frame_times[n] = end - start
+        draw_time += end - draw_start
+
+    spectrum.stop()
+    shutil.rmtree(work_folder, ignore_errors=True)
+
+    t = timer.times
+    t["blit"] = draw_time - t["update"] - t["present"]
+    total = frame_times.sum()
+
+    results.put({
+        "folder": folder,
+        "template": template,
+        "frames": frame_count,
+        "fps": round(frame_count / total, 1),
+        "frame.time.p50.ms": round(float(np.percentile(frame_times, 50)) * 1000, 3),
+        "frame.time.p99.ms": round(float(np.percentile(frame_times, 99)) * 1000, 3),
+        "phase.time.ms": {phase: round(t[phase] / frame_count * 1000, 3) for phase in PHASES},
+        "load.time.s": round(load_time, 3),
+        "peak.rss.kb": get_peak_rss()
+    })
+
+def get_peak_rss():
+    """ Get peak resident set size of the current process
+
+    :return: size in kilobytes or None if not available on the platform
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+def benchmark(config_path, folders, frame_count, recording=None):
+    """ Render every template in the spectrum folders using the SDL dummy driver
+
+    :param config_path: the config.txt with the common settings
+    :param folders: the list of spectrum folder names
+    :param frame_count: the number of frames to render for each template
+    :param recording: the recording or the file with raw frames, None - synthetic frames
+
+    :return: dictionary with the results for all templates
+    """
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1" # keep stdout for JSON
+    base_folder = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.abspath(config_path)
+    context = multiprocessing.get_context("spawn")
+    results = []
+
+    for folder, template in get_templates(base_folder, folders):
+        queue = context.Queue()
+        p = context.Process(target=run_template, args=(config_path, folder, template, base_folder, frame_count, recording, queue))
+        p.start()
+        try:
+            results.append(queue.get(timeout=max(60, frame_count)))
+        except Exception:
+            results.append({"folder": folder, "template": template, "error": f"exit code {p.exitcode}"})
+        p.join(1)
+        if p.is_alive():
+            p.kill()
+
+    return {
+        "source": os.path.abspath(recording) if recording else "synthetic",
+        "frames": frame_count,
+        "machine": platform.machine(),
+        "system": platform.platform(),
+        "python": platform.python_version(),
+        "results": results
+    }
+
+if __name__ == "__main__":
+    """ Benchmark templates: spectrumbenchmark.py [-f frames] [-r recording] [-c config] [folder ...] """
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Render spectrum templates headless and report timings as JSON")
+    parser.add_argument("folders", nargs="*", default=BENCHMARK_FOLDERS, help="spectrum folders")
+    parser.add_argument("-f", "--frames", type=int, default=BENCHMARK_FRAMES, help="frames per template")
+    parser.add_argument("-r", "--recording", help="recording or file with raw frames captured from the named pipe")
+    parser.add_argument("-c", "--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.txt"), help="config.txt with the common settings")
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark(args.config, args.folders, args.frames, args.recording), indent=4))
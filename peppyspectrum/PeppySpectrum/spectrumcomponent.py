@@ -146,6 +146,60 @@ class SpectrumComponent(object):
             except:
                 pass
  
+    def add_blits(self, blits):
+        """ Add component image to the batch of blits.
+        Components which cannot be batched flush the batch and draw themselves.
+        
+        :param blits: list of (surface, dest, area) tuples
+        """
+        if not self.visible or not getattr(self, "content", None): return
+
+        if isinstance(self.content, pygame.Rect):
+            if self.bgr:
+                self.flush_blits(blits)
+                SpectrumComponent.draw(self)
+            return
+
+        comp = self.content
+        if isinstance(comp, tuple):
+            comp = comp[1]
+
+        if not comp: return
+
+        if self.bounding_box != None:
+            blits.append((comp, (self.content_x, self.content_y), self.bounding_box))
+        else:
+            blits.append((comp, (self.content_x, self.content_y)))
+
+    def add_area_blits(self, blits, rects):
+        """ Add parts of the component image under the screen rectangles to the batch of blits
+
+        :param blits: list of (surface, dest, area) tuples
+        :param rects: list of screen rectangles
+        """
+        if not self.visible or not getattr(self, "content", None) or isinstance(self.content, pygame.Rect): return
+
+        comp = self.content
+        if isinstance(comp, tuple):
+            comp = comp[1]
+
+        if not comp: return
+
+        for r in rects:
+            blits.append((comp, r.topleft, r.move(-self.content_x, -self.content_y)))
+
+    def flush_blits(self, blits):
+        """ Draw the batch of blits on Pygame Screen using one call
+
+        :param blits: list of (surface, dest, area) tuples
+        """
+        if blits and self.screen:
+            try:
+                self.screen.blits(blits, False)
+            except:
+                pass
+        blits.clear()
+
     def update(self):
         """ Update Pygame Screen """
         
@@ -21,6 +21,7 @@ import re
 import logging
 
 from configparser import ConfigParser
+from spectrumframe import get_frame_size
 
 PACKAGE_SCREENSAVER = "screensaver"
 SCREEN_INFO = "screen.info"
@@ -42,8 +43,39 @@ CURRENT = "current"
 UPDATE_PERIOD = "update.period"
 MAX_VALUE = "max.value"
 PIPE_NAME = "pipe.name"
+DATA_SOURCE = "data.source"
+SHM_NAME = "shm.name"
+PCM_PIPE_NAME = "pcm.pipe.name"
+PCM_FORMAT = "pcm.format"
+PCM_RATE = "pcm.rate"
+PCM_CHANNELS = "pcm.channels"
+FFT_SIZE = "fft.size"
+RECORD_FILE = "record.file"
+REPLAY_FILE = "replay.file"
+REPLAY_REALTIME = "replay.realtime"
+REPLAY_LOOP = "replay.loop"
+FRAME_FORMAT = "frame.format"
+FRAME_VALUE_WIDTH = "frame.value.width"
+MULTIPROCESS = "multiprocess"
 SIZE = "size"
 UPDATE_UI_INTERVAL = "update.ui.interval"
+BATCH_BLITS = "batch.blits"
+DIRTY_RECTANGLES = "dirty.rectangles"
+ATLAS = "atlas"
+INTERPOLATION_FRAMES = "interpolation.frames"
+INTERPOLATION_CURVE = "interpolation.curve"
+IDLE_TIMEOUT = "idle.timeout"
+QUALITY_GOVERNOR = "quality.governor"
+QUALITY_CPU_LIMIT = "quality.cpu.limit"
+ASSET_CACHE_FOLDER = "asset.cache.folder"
+ASSET_CACHE_SIZE = "asset.cache.size"
+LAYOUT_CACHE_SIZE = "layout.cache.size"
+IMAGE_CACHE_SIZE = "image.cache.size"
+SCALE_FILTER = "scale.filter"
+OPTIMIZE_PIXEL_FORMAT = "optimize.pixel.format"
+OUTPUT = "output"
+STATS_FILE = "stats.file"
+STATS_INTERVAL = "stats.interval"
 
 SDL_ENV = "sdl.env"
 FRAMEBUFFER_DEVICE = "framebuffer.device"
@@ -79,12 +111,16 @@ BAR_GAP = "bar.gap"
 STEPS = "steps"
 TOPPING_HEIGHT = "topping.height"
 TOPPING_STEP = "topping.step"
+ATTACK = "attack"
+RELEASE = "release"
+PEAK_HOLD = "peak.hold"
+PEAK_FALL = "peak.fall"
+TOPPING_MODE = "topping.mode"
 
 AVAILABLE_SPECTRUM_NAMES = "available.spectrum.names"
 BASE_FOLDER = "base.folder"
 SPECTRUM_FOLDER = "spectrum.folder"
 PIPE_BUFFER_SIZE = "pipe.buffer.size"
-PIPE_POLLING_INTERVAL = "pipe_polling_inerval"
 PIPE_SIZE = "pipe_size"
 SCREEN_WIDTH = "screen.width"
 SCREEN_HEIGHT = "screen.height"
@@ -131,17 +167,50 @@ class SpectrumConfigParser(object):
 
         config[UPDATE_PERIOD] = c.getint(CURRENT, UPDATE_PERIOD)
         config[PIPE_NAME] = c.get(CURRENT, PIPE_NAME)
+        config[DATA_SOURCE] = c.get(CURRENT, DATA_SOURCE, fallback="pipe")
+        config[SHM_NAME] = c.get(CURRENT, SHM_NAME, fallback="/dev/shm/peppy_spectrum")
         config[PIPE_BUFFER_SIZE] = 1048576 # as defined for Raspberry OS in /proc/sys/fs/pipe-max-size
         config[MAX_VALUE] = c.getint(CURRENT, MAX_VALUE)
         config[SIZE] = c.getint(CURRENT, SIZE)
         config[UPDATE_UI_INTERVAL] = c.getfloat(CURRENT, UPDATE_UI_INTERVAL)
-        config[PIPE_POLLING_INTERVAL] = config[UPDATE_UI_INTERVAL] / 10
-        config[PIPE_SIZE] = 4 * config[SIZE]
+        config[PCM_PIPE_NAME] = c.get(CURRENT, PCM_PIPE_NAME, fallback="/tmp/peppy_pcm_fifo")
+        config[PCM_FORMAT] = c.get(CURRENT, PCM_FORMAT, fallback="S16_LE")
+        config[PCM_RATE] = c.getint(CURRENT, PCM_RATE, fallback=44100)
+        config[PCM_CHANNELS] = c.getint(CURRENT, PCM_CHANNELS, fallback=2)
+        config[FFT_SIZE] = c.getint(CURRENT, FFT_SIZE, fallback=2048)
+        config[RECORD_FILE] = c.get(CURRENT, RECORD_FILE, fallback="")
+        config[REPLAY_FILE] = c.get(CURRENT, REPLAY_FILE, fallback="")
+        config[REPLAY_REALTIME] = c.getboolean(CURRENT, REPLAY_REALTIME, fallback=True)
+        config[REPLAY_LOOP] = c.getboolean(CURRENT, REPLAY_LOOP, fallback=True)
+        config[FRAME_FORMAT] = c.get(CURRENT, FRAME_FORMAT, fallback="legacy")
+        config[FRAME_VALUE_WIDTH] = c.getint(CURRENT, FRAME_VALUE_WIDTH, fallback=1)
+        if config[FRAME_FORMAT] == "compact":
+            config[PIPE_SIZE] = get_frame_size(config[SIZE], config[FRAME_VALUE_WIDTH])
+        else:
+            config[PIPE_SIZE] = 4 * config[SIZE]
+        config[MULTIPROCESS] = c.getboolean(CURRENT, MULTIPROCESS, fallback=False)
         config[FRAME_RATE] = c.getint(CURRENT, FRAME_RATE)
+        config[IDLE_TIMEOUT] = c.getfloat(CURRENT, IDLE_TIMEOUT, fallback=10)
+        config[QUALITY_GOVERNOR] = c.getboolean(CURRENT, QUALITY_GOVERNOR, fallback=False)
+        config[QUALITY_CPU_LIMIT] = c.getfloat(CURRENT, QUALITY_CPU_LIMIT, fallback=0.9)
+        config[ASSET_CACHE_FOLDER] = c.get(CURRENT, ASSET_CACHE_FOLDER, fallback="")
+        config[ASSET_CACHE_SIZE] = c.getint(CURRENT, ASSET_CACHE_SIZE, fallback=64) * 1024 * 1024
+        config[LAYOUT_CACHE_SIZE] = c.getint(CURRENT, LAYOUT_CACHE_SIZE, fallback=1)
+        config[IMAGE_CACHE_SIZE] = c.getint(CURRENT, IMAGE_CACHE_SIZE, fallback=32) * 1024 * 1024
+        config[SCALE_FILTER] = c.get(CURRENT, SCALE_FILTER, fallback="smooth")
+        config[OPTIMIZE_PIXEL_FORMAT] = c.getboolean(CURRENT, OPTIMIZE_PIXEL_FORMAT, fallback=True)
+        config[OUTPUT] = c.get(CURRENT, OUTPUT, fallback="sdl")
+        config[STATS_FILE] = c.get(CURRENT, STATS_FILE, fallback="")
+        config[STATS_INTERVAL] = c.getfloat(CURRENT, STATS_INTERVAL, fallback=10)
         config[DEPTH] = c.getint(CURRENT, DEPTH)
         config[EXIT_ON_TOUCH] = c.getboolean(CURRENT, EXIT_ON_TOUCH)
         config[USE_LOGGING] = c.getboolean(CURRENT, USE_LOGGING)
         config[USE_TEST_DATA] = c.get(CURRENT, USE_TEST_DATA)
+        config[BATCH_BLITS] = c.getboolean(CURRENT, BATCH_BLITS, fallback=True)
+        config[DIRTY_RECTANGLES] = c.getboolean(CURRENT, DIRTY_RECTANGLES, fallback=True)
+        config[ATLAS] = c.getboolean(CURRENT, ATLAS, fallback=False)
+        config[INTERPOLATION_FRAMES] = c.getint(CURRENT, INTERPOLATION_FRAMES, fallback=0)
+        config[INTERPOLATION_CURVE] = c.get(CURRENT, INTERPOLATION_CURVE, fallback="ease.out.quad")
 
         config[FRAMEBUFFER_DEVICE] = c.get(SDL_ENV, FRAMEBUFFER_DEVICE)
         config[MOUSE_DEVICE] = c.get(SDL_ENV, MOUSE_DEVICE)
@@ -247,6 +316,13 @@ class SpectrumConfigParser(object):
             spectrum[TOPPING_STEP] = self.get_int(c.get(section, TOPPING_STEP))
             spectrum[FGR_FILENAME] = c.get(section, FGR_FILENAME, fallback=None)
             spectrum[STEPS] = c.getint(section, STEPS)
+            spectrum[ATTACK] = c.getfloat(section, ATTACK, fallback=0)
+            spectrum[RELEASE] = c.getfloat(section, RELEASE, fallback=0)
+            spectrum[PEAK_HOLD] = c.getfloat(section, PEAK_HOLD, fallback=0)
+            spectrum[PEAK_FALL] = c.getfloat(section, PEAK_FALL, fallback=None)
+            if spectrum[PEAK_FALL] == None:
+                spectrum[PEAK_FALL] = (spectrum[TOPPING_STEP] or 0) / self.config[UPDATE_UI_INTERVAL]
+            spectrum[TOPPING_MODE] = c.get(section, TOPPING_MODE, fallback="step")
 
             config.append(spectrum)
         
@@ -35,6 +35,7 @@ class SpectrumContainer(SpectrumComponent):
             
         SpectrumComponent.__init__(self, util, c=cnt, bb=bounding_box, bgr=background, v=visible)
         self.components = list()
+        self.batch_blits = False
         if image_filename:
             self.image_filename = image_filename
 
@@ -64,12 +65,38 @@ class SpectrumContainer(SpectrumComponent):
         
         if not self.visible: return
 
+        if self.batch_blits:
+            blits = []
+            self.add_blits(blits)
+            self.flush_blits(blits)
+            return
+
         SpectrumComponent.draw(self)
 
         if self.is_empty(): return
 
         for comp in self.components:
             if comp: comp.draw()
+
+    def add_blits(self, blits):
+        """ Add container and all its components to the batch of blits
+
+        :param blits: list of (surface, dest, area) tuples
+        """
+        if not self.visible: return
+
+        SpectrumComponent.add_blits(self, blits)
+
+        if self.is_empty(): return
+
+        for comp in self.components:
+            if not comp: continue
+
+            if hasattr(comp, "add_blits"):
+                comp.add_blits(blits)
+            else:
+                self.flush_blits(blits)
+                comp.draw()
     
     def draw_area(self, bb):
         if not self.visible: return
@@ -0,0 +1,190 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import struct
+import hashlib
+import logging
+import pygame
+
+CACHE_MAGIC = b"PSAC"
+CACHE_HEADER = "<4sII4s" # magic, width, height, pixel format
+CACHE_HEADER_SIZE = struct.calcsize(CACHE_HEADER)
+CACHE_EXTENSION = ".raw"
+PIXEL_FORMAT = "RGBA"
+
+class SpectrumDiskCache(object):
+    """ Persistent cache of decoded and scaled images.
+    Each surface is stored as raw pixels in a separate file. The file name is the hash of the source path,
+    its modification time and size, the target size and the pixel format, so changed images get new entries.
+    The entries which were not used for the longest time are deleted when the folder exceeds the size budget.
+    The file modification time is the time of the last use.
+    """
+
+    def __init__(self, folder, budget):
+        """ Initializer
+
+        :param folder: the cache folder
+        :param budget: the maximum size of the cache files in bytes
+        """
+        self.folder = folder
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+
+        try:
+            os.makedirs(folder, exist_ok=True)
+        except Exception as e:
+            logging.debug(f"Cannot create cache folder: {folder}")
+            logging.debug(e)
+            self.enabled = False
+            return
+
+        self.prune()
+
+    def prune(self):
+        """ Delete temporary files and the least recently used entries until the cache fits into the budget """
+
+        entries = []
+        try:
+            for entry in os.scandir(self.folder):
+                if entry.name.endswith(".tmp"):
+                    os.remove(entry.path) # left by the interrupted write
+                elif entry.name.endswith(CACHE_EXTENSION):
+                    s = entry.stat()
+                    entries.append((s.st_mtime_ns, s.st_size, entry.path))
+        except Exception as e:
+            logging.debug(e)
+
+        self.size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if self.size <= self.budget:
+                break
+            try:
+                os.remove(path)
+                self.size -= size
+                removed += 1
+            except Exception as e:
+                logging.debug(e)
+
+        if removed:
+            logging.debug(f"Removed {removed} cache files, cache size: {self.size} bytes")
+
+    def get_key(self, path, size, variant=""):
+        """ Create cache key for the image
+
+        :param path: the source image path
+        :param size: the target size or None for the original size
+        :param variant: the name of the scaling method
+
+        :return: cache key or None if the source image is not available
+        """
+        try:
+            s = os.stat(path)
+        except Exception as e:
+            logging.debug(e)
+            return None
+
+        size = "original" if size == None else f"{size[0]}x{size[1]}"
+        key = f"{os.path.abspath(path)}|{s.st_mtime_ns}|{s.st_size}|{size}|{variant}|{PIXEL_FORMAT}"
+
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def get_surface(self, path, size, loader, variant=""):
+        """ Get surface from the cache or create it with the loader and store it in the cache
+
+        :param path: the source image path
+        :param size: the target size or None for the original size
+        :param loader: the function creating the surface in case of cache miss
+        :param variant: the name of the scaling method
+
+        :return: the surface or None
+        """
+        key = self.get_key(path, size, variant) if self.enabled else None
+        if key == None:
+            return loader()
+
+        filename = os.path.join(self.folder, key + CACHE_EXTENSION)
+        surface = self.read(filename)
+        if surface != None:
+            self.hits += 1
+            try:
+                os.utime(filename) # the last use
+            except Exception as e:
+                logging.debug(e)
+            return surface
+
+        self.misses += 1
+        surface = loader()
+        if surface != None:
+            self.write(filename, surface)
+            if self.size > self.budget:
+                self.prune()
+
+        return surface
+
+    def read(self, filename):
+        """ Map cached pixels into the new surface
+
+        :param filename: the cache file
+
+        :return: the surface or None if there is no valid cache file
+        """
+        try:
+            with open(filename, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    magic, w, h, pixel_format = struct.unpack_from(CACHE_HEADER, m)
+                    if magic != CACHE_MAGIC or len(m) != CACHE_HEADER_SIZE + w * h * 4:
+                        return None
+                    pixels = memoryview(m)[CACHE_HEADER_SIZE:]
+                    mapped = pygame.image.frombuffer(pixels, (w, h), pixel_format.decode("ascii"))
+                    surface = mapped.convert_alpha() # copy into the display format while the file is mapped
+                    del mapped
+                    pixels.release()
+                    return surface
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.debug(e)
+            return None
+
+    def write(self, filename, surface):
+        """ Store surface pixels in the cache file
+
+        :param filename: the cache file
+        :param surface: the surface to store
+        """
+        w, h = surface.get_size()
+        temp = f"{filename}.{os.getpid()}.tmp"
+
+        try:
+            with open(temp, "wb") as f:
+                f.write(struct.pack(CACHE_HEADER, CACHE_MAGIC, w, h, PIXEL_FORMAT.encode("ascii")))
+                f.write(pygame.image.tostring(surface, PIXEL_FORMAT))
+                self.size += f.tell()
+            os.replace(temp, filename)
+        except Exception as e:
+            logging.debug(f"Cannot write cache file: {filename}")
+            logging.debug(e)
+            try:
+                os.remove(temp)
+            except Exception:
+                pass
@@ -0,0 +1,107 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+MAX_TIME_STEP = 0.5
+MIN_LEVEL = 0.5 # half a pixel, the decaying bars below it are set to zero
+
+class SpectrumDynamics(object):
+    """ Attack/release smoothing of the bars and peak hold with falling peaks.
+    All parameters and states are arrays with one element per band, all bands are updated at once.
+    """
+
+    def __init__(self, size):
+        """ Initializer
+
+        :param size: the number of bands
+        """
+        self.size = size
+        self.attack = np.zeros(size, dtype=np.float64)
+        self.release = np.zeros(size, dtype=np.float64)
+        self.peak_hold = np.zeros(size, dtype=np.float64)
+        self.peak_fall = np.zeros(size, dtype=np.float64)
+        self.target = np.zeros(size, dtype=np.float64)
+        self.level = np.zeros(size, dtype=np.float64)
+        self.peak = np.zeros(size, dtype=np.float64)
+        self.hold = np.zeros(size, dtype=np.float64)
+        self.pushed = np.ones(size, dtype=bool)
+        self.count = 0
+
+    def set_layout(self, layout):
+        """ Take dynamics parameters from the layout and reset all bands
+
+        :param layout: the layout with dynamics parameters
+        """
+        self.attack[:] = layout.attack
+        self.release[:] = layout.release
+        self.peak_hold[:] = layout.peak_hold
+        self.peak_fall[:] = layout.peak_fall
+        self.reset()
+
+    def reset(self):
+        """ Drop all bands and peaks to zero """
+
+        self.target[:] = 0
+        self.level[:] = 0
+        self.peak[:] = 0
+        self.hold[:] = 0
+        self.pushed[:] = True
+        self.count = 0
+
+    def set_target(self, heights):
+        """ Set new target heights
+
+        :param heights: array of bar heights
+        """
+        n = min(len(heights), self.size)
+        self.target[:n] = heights[:n]
+        self.count = max(self.count, n)
+
+    def get_coefficients(self, time_constants, dt):
+        """ Get smoothing coefficients for the time step
+
+        :param time_constants: array of time constants in seconds, 0 - no smoothing
+        :param dt: time step in seconds
+
+        :return: array of coefficients, 1 - jump to the target
+        """
+        smoothed = time_constants > 0
+        k = np.ones(self.size, dtype=np.float64)
+        k[smoothed] = -np.expm1(-dt / time_constants[smoothed])
+        return k
+
+    def update(self, dt):
+        """ Move bands toward targets, hold and drop peaks
+
+        :param dt: time since the previous update in seconds
+        """
+        dt = min(max(dt, 0), MAX_TIME_STEP)
+
+        rising = self.target > self.level
+        k = np.where(rising, self.get_coefficients(self.attack, dt), self.get_coefficients(self.release, dt))
+        self.level += (self.target - self.level) * k
+        self.level[(self.level < MIN_LEVEL) & (self.target < MIN_LEVEL)] = 0 # exponential release never reaches zero
+
+        pushed = self.level >= self.peak
+        self.pushed[:] = pushed
+        self.hold -= dt
+        falling = ~pushed & (self.hold <= 0)
+        self.peak[falling] -= self.peak_fall[falling] * dt
+        self.peak[pushed] = self.level[pushed]
+        self.hold[pushed] = self.peak_hold[pushed]
+        np.maximum(self.peak, self.level, out=self.peak)
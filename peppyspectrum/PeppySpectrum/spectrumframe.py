@@ -0,0 +1,110 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import struct
+import numpy as np
+
+# Compact frame: header followed by one unsigned little-endian value per band
+# header: magic, version, value width in bytes, band count, reserved, sequence number, capture timestamp (us, CLOCK_MONOTONIC)
+FRAME_MAGIC = b"PS"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("<2sBBHHIQ")
+VALUE_TYPES = {1: "<u1", 2: "<u2", 4: "<u4"}
+LEGACY_VALUE_TYPE = "<u4"
+
+def get_frame_size(bands, width):
+    """ Get the size of the compact frame
+
+    :param bands: the number of bands
+    :param width: value width in bytes
+
+    :return: frame size in bytes
+    """
+    return FRAME_HEADER.size + bands * width
+
+def encode_frame(values, sequence, width=1, timestamp=None):
+    """ Encode values as the compact frame
+
+    :param values: list or array of band values
+    :param sequence: frame sequence number
+    :param width: value width in bytes (1, 2 or 4)
+    :param timestamp: capture time in microseconds, None - current monotonic time
+
+    :return: frame bytes
+    """
+    if timestamp == None:
+        timestamp = time.monotonic_ns() // 1000
+
+    payload = np.asarray(values).astype(VALUE_TYPES[width]).tobytes()
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, width, int(len(payload) / width), 0, sequence & 0xFFFFFFFF, timestamp)
+
+    return header + payload
+
+class SpectrumFrameDecoder(object):
+    """ Decoder of the legacy (raw 32-bit values) and compact spectrum frames.
+    For compact frames keeps the number of dropped frames and the latency.
+    """
+
+    def __init__(self, size):
+        """ Initializer
+
+        :param size: the maximum number of bands
+        """
+        self.size = size
+        self.sequence = None
+        self.frames = 0
+        self.dropped = 0
+        self.latency = 0
+        self.invalid = 0
+
+    def decode(self, data):
+        """ Decode frame
+
+        :param data: frame bytes
+
+        :return: numpy array of band values or None if the compact frame is invalid
+        """
+        if len(data) >= FRAME_HEADER.size and data[0 : 2] == FRAME_MAGIC:
+            return self.decode_compact(data)
+
+        words = min(int(len(data) / 4), self.size)
+        return np.frombuffer(data, dtype=LEGACY_VALUE_TYPE, count=words)
+
+    def decode_compact(self, data):
+        """ Decode compact frame and update frame statistics
+
+        :param data: frame bytes
+
+        :return: numpy array of band values or None if the frame is invalid
+        """
+        magic, version, width, bands, _, sequence, timestamp = FRAME_HEADER.unpack_from(data, 0)
+        if magic != FRAME_MAGIC or version != FRAME_VERSION or width not in VALUE_TYPES \
+            or bands == 0 or len(data) < FRAME_HEADER.size + bands * width:
+            self.invalid += 1
+            return None
+
+        if self.sequence != None:
+            gap = (sequence - self.sequence - 1) & 0xFFFFFFFF
+            if gap < 0x80000000:
+                self.dropped += gap
+        self.sequence = sequence
+        self.frames += 1
+        self.latency = time.monotonic_ns() // 1000 - timestamp
+
+        count = min(bands, self.size)
+        return np.frombuffer(data, dtype=VALUE_TYPES[width], count=count, offset=FRAME_HEADER.size)
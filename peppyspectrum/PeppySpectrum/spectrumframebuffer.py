@@ -0,0 +1,83 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+class SpectrumFrame(object):
+    """ Bar heights of one data update """
+
+    def __init__(self, size):
+        """ Initializer
+
+        :param size: the number of bars
+        """
+        self.heights = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.index = 0
+        self.sequence = 0
+
+class SpectrumFrameBuffer(object):
+    """ Lock-free frame exchange between the data thread and the render thread.
+    The producer fills the back frame and publishes it by replacing the front frame reference,
+    which is a single atomic assignment. The renderer only reads the published front frame.
+    The renderer claims the frame it reads and the producer never takes the claimed frame as the back frame,
+    so the frame stays unchanged until the renderer gets the next one however many frames are published meanwhile.
+    """
+
+    def __init__(self, size):
+        """ Initializer
+
+        :param size: the number of bars
+        """
+        self.frames = [SpectrumFrame(size) for _ in range(3)]
+        self.back = self.frames[0]
+        self.front = None
+        self.reading = None
+        self.sequence = 0
+
+    def publish(self, heights, index):
+        """ Copy bar heights into the back frame and publish it
+
+        :param heights: array of bar heights
+        :param index: the layout index used to calculate the heights
+        """
+        frame = self.back
+        n = min(len(heights), len(frame.heights))
+        frame.heights[:n] = heights[:n]
+        frame.count = n
+        frame.index = index
+        self.sequence += 1
+        frame.sequence = self.sequence
+
+        self.front = frame
+        reading = self.reading # the renderer can change the claim at any time, the choice uses one value
+        self.back = next(f for f in self.frames if f is not frame and f is not reading) # one of three frames is always free
+
+    def get_front(self):
+        """ Get the newest published frame and claim it for reading.
+        If the frame was replaced before the claim, the producer could have taken it as the back frame,
+        so the claim is repeated with the new front frame.
+
+        :return: the frame or None if nothing was published
+        """
+        frame = self.front
+        self.reading = frame
+        while frame is not self.front:
+            frame = self.front
+            self.reading = frame
+
+        return frame
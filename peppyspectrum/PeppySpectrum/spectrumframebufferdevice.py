@@ -0,0 +1,195 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import fcntl
+import struct
+import logging
+import pygame
+import numpy as np
+
+FBIOGET_VSCREENINFO = 0x4600
+FBIOGET_FSCREENINFO = 0x4602
+VSCREENINFO_SIZE = 160
+VSCREENINFO = "<8I12I" # geometry, bits per pixel, grayscale, red, green, blue, transp bitfields
+FSCREENINFO = "@16sLIIIIHHHI" # id, smem_start, smem_len, type, type_aux, visual, pan and wrap steps, line_length
+FSCREENINFO_SIZE = 80
+
+# (offset, length) of red, green and blue for the devices without screen info
+DEFAULT_CHANNELS = {
+    16: ((11, 5), (5, 6), (0, 5)), # RGB565
+    32: ((16, 8), (8, 8), (0, 8)) # XRGB8888
+}
+
+class SpectrumFramebufferDevice(object):
+    """ Output to the memory-mapped Linux framebuffer device bypassing SDL.
+    Geometry and pixel format are read from the device. A regular file can be used instead of the device,
+    in that case the screen size and depth from the configuration are used.
+    The visible area starts at the offsets of the virtual screen read from the device.
+    Only dirty rectangles are converted from the offscreen surface and copied to the framebuffer.
+    The surface in the framebuffer format is copied without conversion, so 16 bpp devices are drawn
+    on the 16 bpp surface created by get_surface.
+    """
+
+    def __init__(self, name, width, height, depth):
+        """ Initializer
+
+        :param name: framebuffer device path
+        :param width: the screen width used if the device has no screen info
+        :param height: the screen height used if the device has no screen info
+        :param depth: bits per pixel used if the device has no screen info, 16 or 32
+        """
+        self.name = name
+        self.width = width
+        self.height = height
+        self.bits_per_pixel = depth if depth in DEFAULT_CHANNELS else 32
+        self.channels = DEFAULT_CHANNELS[self.bits_per_pixel]
+        self.line_length = width * self.bits_per_pixel // 8
+        self.virtual_height = height
+        self.x_offset = 0
+        self.y_offset = 0
+        self.fd = None
+        self.memory = None
+        self.pixels = None
+
+    def open(self):
+        """ Open device, read screen info and map the framebuffer memory
+
+        :return: True - success, False - failure
+        """
+        try:
+            self.fd = os.open(self.name, os.O_RDWR)
+            if not self.read_screen_info():
+                size = self.line_length * self.height
+                if os.fstat(self.fd).st_size < size:
+                    os.ftruncate(self.fd, size)
+            self.memory = mmap.mmap(self.fd, self.line_length * self.virtual_height, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except Exception as e:
+            logging.debug(f"Cannot open framebuffer: {self.name}")
+            logging.debug(e)
+            self.close()
+            return False
+
+        pixel_type = np.uint16 if self.bits_per_pixel == 16 else np.uint32
+        stride = self.line_length // np.dtype(pixel_type).itemsize
+        pixels = np.ndarray((self.virtual_height, stride), dtype=pixel_type, buffer=self.memory)
+        self.pixels = pixels[self.y_offset : self.y_offset + self.height, self.x_offset : self.x_offset + self.width]
+        logging.debug(f"Framebuffer {self.name}: {self.width}x{self.height}, offset {self.x_offset}x{self.y_offset}, {self.bits_per_pixel} bpp, channels {self.channels}")
+
+        return True
+
+    def read_screen_info(self):
+        """ Read geometry and pixel format of the framebuffer device
+
+        :return: True - screen info was read, False - not a framebuffer device
+        """
+        try:
+            v = fcntl.ioctl(self.fd, FBIOGET_VSCREENINFO, bytes(VSCREENINFO_SIZE))
+            f = fcntl.ioctl(self.fd, FBIOGET_FSCREENINFO, bytes(FSCREENINFO_SIZE))
+        except OSError:
+            return False
+
+        info = struct.unpack_from(VSCREENINFO, v)
+        bits_per_pixel = info[6]
+        if bits_per_pixel not in DEFAULT_CHANNELS:
+            raise ValueError(f"Unsupported framebuffer depth: {bits_per_pixel}")
+
+        self.width, self.height = info[0], info[1]
+        self.virtual_height = max(info[3], self.height)
+        self.x_offset, self.y_offset = info[4], info[5]
+        self.bits_per_pixel = bits_per_pixel
+        self.channels = ((info[8], info[9]), (info[11], info[12]), (info[14], info[15]))
+        self.line_length = struct.unpack_from(FSCREENINFO, f)[-1]
+
+        return True
+
+    def close(self):
+        """ Unmap framebuffer memory and close the device """
+
+        self.pixels = None
+        if self.memory != None:
+            try:
+                self.memory.close()
+            except Exception as e:
+                logging.debug(e)
+            self.memory = None
+
+        if self.fd != None:
+            os.close(self.fd)
+            self.fd = None
+
+    def get_surface(self, width, height):
+        """ Create the offscreen surface in the framebuffer pixel format
+
+        :param width: the surface width
+        :param height: the surface height
+
+        :return: the surface
+        """
+        masks = [((1 << length) - 1) << offset for offset, length in self.channels]
+
+        return pygame.Surface((width, height), 0, self.bits_per_pixel, masks + [0])
+
+    def convert(self, pixels, shifts, losses):
+        """ Convert surface pixels to the framebuffer pixel format
+
+        :param pixels: 2D array of 16-bit or 32-bit surface pixels
+        :param shifts: red, green and blue shifts of the surface pixels
+        :param losses: red, green and blue losses of the surface pixels, the number of bits less than 8
+
+        :return: 2D array of framebuffer pixels
+        """
+        if pixels.dtype == self.pixels.dtype and self.channels == tuple((s, 8 - l) for s, l in zip(shifts, losses)):
+            return pixels # the same format
+
+        pixels = pixels.astype(np.uint32, copy=False)
+        result = None
+        for shift, loss, (offset, length) in zip(shifts, losses, self.channels):
+            channel = ((pixels >> shift) & (0xFF >> loss)) << loss
+            if length < 8:
+                channel >>= 8 - length
+            channel <<= offset
+            result = channel if result is None else result | channel
+
+        return result.astype(self.pixels.dtype, copy=False)
+
+    def update(self, surface, rects):
+        """ Copy rectangles of the surface to the framebuffer
+
+        :param surface: the offscreen 16-bit or 32-bit surface
+        :param rects: rectangle or list of rectangles to copy
+        """
+        if self.pixels is None:
+            return
+
+        if isinstance(rects, pygame.Rect):
+            rects = [rects]
+
+        height, width = self.pixels.shape
+        screen = pygame.Rect(0, 0, min(width, surface.get_width()), min(height, surface.get_height()))
+        shifts = surface.get_shifts()[:3]
+        losses = surface.get_losses()[:3]
+        source = pygame.surfarray.pixels2d(surface) # indexed by x, y
+
+        for r in rects:
+            r = screen.clip(r)
+            if r.w == 0 or r.h == 0:
+                continue
+            self.pixels[r.top : r.bottom, r.left : r.right] = self.convert(source[r.left : r.right, r.top : r.bottom].T, shifts, losses)
+
+        del source # unlock the surface
@@ -0,0 +1,104 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import logging
+
+# Quality tiers, each tier includes all previous ones
+TIER_FULL = 0
+TIER_NO_REFLECTIONS = 1
+TIER_NO_TOPPINGS = 2
+TIER_LOW_FRAME_RATE = 3
+TIER_COARSE_STEPS = 4
+TIER_NAMES = ["full", "no reflections", "no toppings", "low frame rate", "coarse steps"]
+
+WINDOW = 1.0 # measurement window in seconds
+FRAME_BUDGET = 0.9 # share of the frame period available for rendering
+HEADROOM = 0.5 # step up when the load is below this share of the budget
+UP_WINDOWS = 5 # the number of windows with headroom before stepping up
+
+class SpectrumGovernor(object):
+    """ Adaptive quality governor.
+    Measures render time and process CPU over fixed windows, steps down through quality tiers
+    when the budget is exceeded and steps back up after several windows with enough headroom.
+    """
+
+    def __init__(self, cpu_limit):
+        """ Initializer
+
+        :param cpu_limit: the share of one CPU core available for the process
+        """
+        self.cpu_limit = cpu_limit
+        self.tier = TIER_FULL
+        self.good_windows = 0
+        self.reset()
+
+    def reset(self):
+        """ Start the new measurement window, called after tier change or pause """
+
+        self.window_start = time.monotonic()
+        self.cpu_start = time.process_time()
+        self.render_time = 0
+        self.frames = 0
+
+    def update(self, render_time, period):
+        """ Add the frame to the window and check the budget when the window ends
+
+        :param render_time: time spent for rendering the frame in seconds
+        :param period: the current frame period in seconds
+
+        :return: new tier or None if the tier didn't change
+        """
+        self.render_time += render_time
+        self.frames += 1
+
+        now = time.monotonic()
+        wall = now - self.window_start
+        if wall < WINDOW:
+            return None
+
+        render_load = self.render_time / self.frames / (period * FRAME_BUDGET)
+        cpu_load = (time.process_time() - self.cpu_start) / wall / self.cpu_limit
+        load = max(render_load, cpu_load)
+        self.reset()
+
+        if load > 1 and self.tier < TIER_COARSE_STEPS:
+            self.good_windows = 0
+            return self.set_tier(self.tier + 1, load)
+
+        if load < HEADROOM and self.tier > TIER_FULL:
+            self.good_windows += 1
+            if self.good_windows >= UP_WINDOWS:
+                self.good_windows = 0
+                return self.set_tier(self.tier - 1, load)
+        else:
+            self.good_windows = 0
+
+        return None
+
+    def set_tier(self, tier, load):
+        """ Change tier and log the change
+
+        :param tier: new tier
+        :param load: the load which caused the change, 1 - the budget is fully used
+
+        :return: new tier
+        """
+        logging.debug(f"Quality tier changed from '{TIER_NAMES[self.tier]}' to '{TIER_NAMES[tier]}', load {load:.2f}")
+        self.tier = tier
+
+        return tier
@@ -0,0 +1,110 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from threading import Lock
+
+DEFAULT_BUDGET = 32 * 1024 * 1024
+
+class SpectrumImageCache(object):
+    """ Memory-bounded cache of surfaces with least recently used eviction.
+    Entries are keyed by (path, size, format), the cost of an entry is width * height * bytes per pixel.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        """ Initializer
+
+        :param budget: the maximum size of all cached surfaces in bytes
+        """
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_cost(self, surface):
+        """ Get memory used by the surface pixels
+
+        :param surface: the surface
+
+        :return: size in bytes
+        """
+        w, h = surface.get_size()
+
+        return w * h * surface.get_bytesize()
+
+    def set_budget(self, budget):
+        """ Change the cache budget and evict entries above the new budget
+
+        :param budget: the maximum size of all cached surfaces in bytes
+        """
+        with self.lock:
+            self.budget = budget
+            self.evict()
+
+    def get(self, key):
+        """ Get surface from the cache and mark it as the most recently used one
+
+        :param key: tuple (path, size, format)
+
+        :return: the surface or None
+        """
+        with self.lock:
+            surface = self.entries.get(key)
+            if surface == None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return surface
+
+    def put(self, key, surface):
+        """ Put surface into the cache. Surfaces larger than the whole budget are not cached.
+
+        :param key: tuple (path, size, format)
+        :param surface: the surface
+        """
+        cost = self.get_cost(surface)
+        if cost > self.budget:
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old != None:
+                self.size -= self.get_cost(old)
+            self.entries[key] = surface
+            self.size += cost
+            self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache fits the budget """
+
+        while self.size > self.budget and self.entries:
+            _, surface = self.entries.popitem(last=False)
+            self.size -= self.get_cost(surface)
+            self.evictions += 1
+
+    def clear(self):
+        """ Remove all entries """
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
@@ -0,0 +1,90 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import logging
+import numpy as np
+
+EASING_CURVES = {
+    "linear": lambda t: t,
+    "ease.out.quad": lambda t: t * (2 - t),
+    "ease.out.cubic": lambda t: 1 - (1 - t) ** 3,
+    "ease.in.out.sine": lambda t: 0.5 - 0.5 * math.cos(math.pi * t)
+}
+DEFAULT_CURVE = "ease.out.quad"
+
+class SpectrumInterpolator(object):
+    """ Moves all bars from their current heights to the latest target heights over several rendered frames """
+
+    def __init__(self, size, frames, curve):
+        """ Initializer
+
+        :param size: the number of bars
+        :param frames: the number of rendered frames to reach the target
+        :param curve: easing curve name
+        """
+        self.frames = frames
+        if curve not in EASING_CURVES:
+            logging.debug(f"Unknown easing curve: {curve}")
+            curve = DEFAULT_CURVE
+        self.curve = EASING_CURVES[curve]
+        self.start = np.zeros(size, dtype=np.float64)
+        self.target = np.zeros(size, dtype=np.float64)
+        self.current = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.frame = frames
+
+    def reset(self):
+        """ Drop all bars to zero without animation """
+
+        self.start[:] = 0
+        self.target[:] = 0
+        self.current[:] = 0
+        self.count = 0
+        self.frame = self.frames
+
+    def set_target(self, heights):
+        """ Start moving to the new heights from the current ones
+
+        :param heights: array of target bar heights
+        """
+        n = min(len(heights), len(self.target))
+        self.start[:] = self.current
+        self.target[:n] = heights[:n]
+        self.count = max(self.count, n)
+        self.frame = 0
+
+    def is_active(self):
+        """ Check if the bars didn't reach the target yet
+
+        :return: True - bars are moving, False - bars reached the target
+        """
+        return self.frame < self.frames
+
+    def next(self):
+        """ Calculate bar heights for the next rendered frame
+
+        :return: array of bar heights
+        """
+        if self.frame < self.frames:
+            self.frame += 1
+            k = self.curve(self.frame / self.frames)
+            np.subtract(self.target, self.start, out=self.current)
+            self.current *= k
+            self.current += self.start
+
+        return self.current[:self.count]
@@ -0,0 +1,178 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import select
+import logging
+
+OPEN_RETRY_INTERVAL = 1.0
+
+class SpectrumPipe(object):
+    """ Event driven reader of the spectrum frames from the named pipe.
+    Waits for data with poll, drains the pipe with one large read and returns the newest complete frame.
+    Incomplete frames are kept for the next read. The missing pipe is opened again periodically
+    and the pipe is reopened when the writer has gone.
+    """
+
+    def __init__(self, name, frame_size, buffer_size):
+        """ Initializer
+
+        :param name: the named pipe path
+        :param frame_size: the size of one frame in bytes
+        :param buffer_size: the size of the read buffer in bytes
+        """
+        self.name = name
+        self.frame_size = frame_size
+        self.pipe = None
+        self.open_time = time.monotonic()
+        self.open_failed = False
+        self.poller = select.poll()
+        self.buffer = bytearray(max(buffer_size, 2 * frame_size))
+        self.view = memoryview(self.buffer)
+        self.filled = 0
+        self.eof = False
+        self.reads = 0
+        self.bytes = 0
+
+    def is_open(self):
+        """ Check if the named pipe is open
+
+        :return: True - open, False - not open
+        """
+        return self.pipe != None
+
+    def open(self):
+        """ Open named pipe """
+
+        self.open_time = time.monotonic()
+        try:
+            self.pipe = os.open(self.name, os.O_RDONLY | os.O_NONBLOCK)
+            self.poller.register(self.pipe, select.POLLIN)
+            self.open_failed = False
+        except Exception as e:
+            if not self.open_failed:
+                logging.debug("Cannot open named pipe: " + self.name)
+                logging.debug(e)
+            self.open_failed = True
+
+    def reopen(self):
+        """ Reopen named pipe after the writer has gone.
+        Poll on the new descriptor blocks until the next writer sends data instead of reporting hangup.
+        """
+        self.close()
+        self.open()
+
+    def retry_open(self, timeout):
+        """ Try to open the missing named pipe again, wait if it's still missing
+
+        :param timeout: waiting time in seconds
+
+        :return: True - the pipe is open, False - the pipe is still missing
+        """
+        if time.monotonic() - self.open_time >= OPEN_RETRY_INTERVAL:
+            self.open()
+
+        if self.pipe == None:
+            time.sleep(timeout)
+            return False
+
+        return True
+
+    def close(self):
+        """ Close named pipe """
+
+        if self.pipe == None:
+            return
+
+        try:
+            self.poller.unregister(self.pipe)
+            os.close(self.pipe)
+        except Exception as e:
+            logging.debug(e)
+
+        self.pipe = None
+        self.filled = 0
+
+    def flush(self):
+        """ Discard all data available in the pipe """
+
+        self.drain()
+        self.filled = 0
+
+    def drain(self):
+        """ Read everything available in the pipe into the buffer """
+
+        if self.pipe == None:
+            return
+
+        self.eof = False
+        while True:
+            if self.filled == len(self.buffer):
+                self.compact()
+
+            try:
+                n = os.readv(self.pipe, [self.view[self.filled:]])
+            except BlockingIOError:
+                break
+            except Exception as e:
+                logging.debug(e)
+                break
+
+            self.reads += 1
+            if n == 0:
+                self.eof = True
+                break
+
+            self.filled += n
+            self.bytes += n
+
+    def compact(self):
+        """ Drop all complete frames from the full buffer except the newest one """
+
+        keep = self.filled % self.frame_size + self.frame_size
+        self.buffer[0 : keep] = self.buffer[self.filled - keep : self.filled]
+        self.filled = keep
+
+    def read(self, timeout=0):
+        """ Wait for the data and return the newest complete frame
+
+        :param timeout: maximum waiting time in seconds
+
+        :return: the newest frame or None if there is no complete frame
+        """
+        if self.pipe == None and not self.retry_open(timeout):
+            return None
+
+        if not self.poller.poll(int(timeout * 1000)):
+            return None
+
+        self.drain()
+
+        frames = int(self.filled / self.frame_size)
+        if frames == 0:
+            if self.eof:
+                self.reopen() # no writer, poll doesn't block
+            return None
+
+        end = frames * self.frame_size
+        frame = bytes(self.view[end - self.frame_size : end])
+        partial = self.filled - end
+        self.buffer[0 : partial] = self.buffer[end : self.filled]
+        self.filled = partial
+
+        return frame
@@ -0,0 +1,108 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import pygame
+import numpy as np
+
+FORMAT_OPAQUE = "opaque"
+FORMAT_COLORKEY = "colorkey"
+FORMAT_ALPHA = "alpha"
+
+class SpectrumPixelFormat(object):
+    """ Pixel format optimizer.
+    Inspects the alpha channel of the surface and selects the cheapest format which renders the same way:
+    the screen format for opaque surfaces, the screen format with RLE color key for surfaces
+    with fully transparent and fully opaque pixels only, per-pixel alpha for all other surfaces.
+    The screen is the display surface or the offscreen surface in the framebuffer format e.g. 16 bpp RGB565.
+    """
+
+    def __init__(self, screen):
+        """ Initializer
+
+        :param screen: the surface which the images are drawn on
+        """
+        self.screen = screen
+        self.reset()
+
+    def reset(self):
+        """ Reset format counters and memory statistics """
+
+        self.formats = {FORMAT_OPAQUE: 0, FORMAT_COLORKEY: 0, FORMAT_ALPHA: 0}
+        self.memory_before = 0
+        self.memory_after = 0
+
+    def get_memory(self, surface):
+        """ Get memory used by the surface pixels
+
+        :param surface: the surface
+
+        :return: size in bytes
+        """
+        return surface.get_pitch() * surface.get_height()
+
+    def optimize(self, surface):
+        """ Convert surface to the cheapest format
+
+        :param surface: the surface with per-pixel alpha
+
+        :return: the optimized surface
+        """
+        if surface == None:
+            return None
+
+        if not surface.get_flags() & pygame.SRCALPHA or surface.get_bitsize() != 32:
+            return surface
+
+        alpha = pygame.surfarray.pixels_alpha(surface)
+        transparent = alpha == 0
+        opaque = alpha == 255
+        del alpha # unlock the surface
+
+        if opaque.all():
+            optimized = surface.convert(self.screen)
+            surface_format = FORMAT_OPAQUE
+        elif (opaque | transparent).all() and self.screen.get_bytesize() in (2, 4):
+            optimized = self.get_colorkey_surface(surface, transparent)
+            surface_format = FORMAT_COLORKEY
+        else:
+            optimized = surface
+            surface_format = FORMAT_ALPHA
+
+        self.formats[surface_format] += 1
+        self.memory_before += self.get_memory(surface)
+        self.memory_after += self.get_memory(optimized)
+
+        return optimized
+
+    def get_colorkey_surface(self, surface, transparent):
+        """ Convert surface to the screen format and mark transparent pixels by the unused color
+
+        :param surface: the surface with per-pixel alpha
+        :param transparent: array of transparent pixels
+
+        :return: the surface with color key
+        """
+        converted = surface.convert(self.screen)
+        pixels = pygame.surfarray.pixels2d(converted)
+        used = np.unique(pixels[~transparent])
+        key = int(np.setdiff1d(np.arange(len(used) + 1), used)[0]) # the color which isn't used by opaque pixels
+        pixels[transparent] = key
+        del pixels
+
+        converted.set_colorkey(key, pygame.RLEACCEL)
+
+        return converted
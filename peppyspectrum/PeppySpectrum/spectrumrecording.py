@@ -0,0 +1,295 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import struct
+import logging
+import numpy as np
+
+from threading import Lock
+
+# Recording: file header followed by records, each record is the record header and the frame bytes
+# file header: magic, version, reserved
+# record header: arrival time (us since the start of the recording), frame size in bytes
+MAGIC = b"PSRC"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHH")
+RECORD_HEADER = struct.Struct("<QI")
+FLUSH_INTERVAL = 1.0 # seconds between writing the buffered frames to the file
+
+def is_recording(path):
+    """ Check if the file is the frame recording
+
+    :param path: the file path
+
+    :return: True - recording, False - other file
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(FILE_HEADER.size)
+    except Exception:
+        return False
+
+    return len(header) == FILE_HEADER.size and FILE_HEADER.unpack(header)[0] == MAGIC
+
+class SpectrumRecorder(object):
+    """ Data source wrapper which writes every frame read from the data source with its arrival time
+    to the recording file. The file is flushed on the interval, so only the last interval is lost if the program is killed.
+    All other calls and attributes are passed to the wrapped data source.
+    """
+
+    def __init__(self, source, path):
+        """ Initializer
+
+        :param source: the data source e.g. the named pipe
+        :param path: the recording file
+        """
+        self.source = source
+        self.path = path
+        self.file = None
+        self.start_time = None
+        self.flush_time = None
+        self.frames = 0
+
+    def __getattr__(self, name):
+        """ Get attribute of the wrapped data source
+
+        :param name: attribute name
+
+        :return: attribute value
+        """
+        return getattr(self.source, name)
+
+    def is_open(self):
+        """ Check if the data source is open
+
+        :return: True - open, False - not open
+        """
+        return self.source.is_open()
+
+    def open(self):
+        """ Open the data source and create the recording file """
+
+        self.source.open()
+        if self.file != None:
+            return
+
+        try:
+            self.file = open(self.path, "wb")
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0))
+            self.file.flush()
+            self.start_time = self.flush_time = time.monotonic()
+            logging.debug(f"Recording frames to: {self.path}")
+        except Exception as e:
+            logging.debug(f"Cannot create recording: {self.path}")
+            logging.debug(e)
+            self.file = None
+
+    def close(self):
+        """ Close the data source and the recording file """
+
+        self.source.close()
+        if self.file != None:
+            try:
+                self.file.close()
+            except Exception as e:
+                logging.debug(e)
+            self.file = None
+            logging.debug(f"Recorded {self.frames} frames")
+
+    def flush(self):
+        """ Flush the data source """
+
+        self.source.flush()
+
+    def read(self, timeout=0):
+        """ Read the frame from the data source and record it
+
+        :param timeout: maximum waiting time in seconds
+
+        :return: the frame or None
+        """
+        frame = self.source.read(timeout)
+        if frame != None and self.file != None:
+            self.write(frame)
+
+        return frame
+
+    def write(self, frame):
+        """ Append the frame to the recording
+
+        :param frame: frame bytes
+        """
+        now = time.monotonic()
+        arrival = int((now - self.start_time) * 1000000)
+        try:
+            self.file.write(RECORD_HEADER.pack(arrival, len(frame)))
+            self.file.write(frame)
+            self.frames += 1
+            if now - self.flush_time >= FLUSH_INTERVAL:
+                self.file.flush()
+                self.flush_time = now
+        except Exception as e:
+            logging.warning(f"Recording stopped after {self.frames} frames, cannot write: {self.path}")
+            logging.warning(e)
+            try:
+                self.file.close()
+            except Exception as e:
+                logging.debug(e)
+            self.file = None
+
+class SpectrumReplay(object):
+    """ Data source which plays the recording.
+    In real time mode frames are returned at their recorded arrival times, the newest frame is returned
+    if several frames are due like from the named pipe. Otherwise each read returns the next frame immediately,
+    so replay is deterministic and runs as fast as the renderer.
+    """
+
+    def __init__(self, path, realtime=True, loop=True):
+        """ Initializer
+
+        :param path: the recording file
+        :param realtime: True - real time, False - as fast as possible
+        :param loop: True - start again after the last frame, False - stop after the last frame
+        """
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.times = None
+        self.frames = None
+        self.position = 0
+        self.start_time = time.monotonic()
+        self.dropped = 0
+        self.lock = Lock()
+
+    def is_open(self):
+        """ Check if the recording is loaded
+
+        :return: True - loaded, False - not loaded
+        """
+        return self.frames != None
+
+    def open(self):
+        """ Load the recording. Can be called from the data source thread and from the first read. """
+
+        with self.lock:
+            if self.frames == None:
+                self.load()
+
+    def load(self):
+        """ Parse the recording file """
+
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except Exception as e:
+            logging.debug(f"Cannot open recording: {self.path}")
+            logging.debug(e)
+            return
+
+        if len(data) < FILE_HEADER.size or FILE_HEADER.unpack_from(data, 0)[0:2] != (MAGIC, VERSION):
+            logging.debug(f"Invalid recording: {self.path}")
+            return
+
+        times = []
+        frames = []
+        offset = FILE_HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            arrival, size = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+            if offset + size > len(data):
+                break # the last frame was cut off
+            times.append(arrival)
+            frames.append(data[offset : offset + size])
+            offset += size
+
+        if len(frames) == 0:
+            logging.debug(f"No frames in recording: {self.path}")
+            return
+
+        self.times = np.array(times, dtype=np.float64) / 1000000
+        self.frames = frames
+        self.position = 0
+        self.start_time = time.monotonic()
+        logging.debug(f"Replaying {len(frames)} frames from: {self.path}")
+
+    def close(self):
+        """ Unload the recording """
+
+        self.times = None
+        self.frames = None
+
+    def flush(self):
+        """ Skip the frames which are due, continue from the current position """
+
+        if self.frames != None and self.position < len(self.frames):
+            self.start_time = time.monotonic() - self.times[self.position]
+
+    def read(self, timeout=0):
+        """ Get the next frame
+
+        :param timeout: maximum waiting time in seconds
+
+        :return: the frame or None if there is no frame during the timeout
+        """
+        if self.frames == None:
+            self.open()
+            if self.frames == None:
+                time.sleep(timeout)
+                return None
+
+        if self.position == len(self.frames):
+            if not self.loop:
+                time.sleep(timeout)
+                return None
+            self.position = 0
+            self.start_time = time.monotonic()
+
+        if not self.realtime:
+            frame = self.frames[self.position]
+            self.position += 1
+            return frame
+
+        elapsed = time.monotonic() - self.start_time
+        wait = self.times[self.position] - elapsed
+        if wait > timeout:
+            time.sleep(timeout)
+            return None
+        if wait > 0:
+            time.sleep(wait)
+            elapsed += wait
+
+        last = int(np.searchsorted(self.times, elapsed, side="right")) - 1
+        last = max(last, self.position)
+        self.dropped += last - self.position
+        self.position = last + 1
+
+        return self.frames[last]
+
+if __name__ == "__main__":
+    """ Print recording summary: spectrumrecording.py recording """
+
+    import sys
+
+    replay = SpectrumReplay(sys.argv[1])
+    replay.open()
+    if replay.frames == None:
+        print(f"Cannot read recording: {sys.argv[1]}")
+    else:
+        intervals = np.diff(replay.times) * 1000 if len(replay.times) > 1 else np.zeros(1)
+        print(f"frames: {len(replay.frames)}, duration: {replay.times[-1]:.3f} s, frame sizes: {sorted(set(map(len, replay.frames)))}")
+        print(f"interval ms: mean {intervals.mean():.3f}, p50 {np.percentile(intervals, 50):.3f}, p99 {np.percentile(intervals, 99):.3f}, max {intervals.max():.3f}")
@@ -0,0 +1,73 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+class SpectrumScheduler(object):
+    """ Frame scheduler based on the monotonic clock.
+    Keeps fixed frame deadlines, compensates the time spent for rendering and counts missed deadlines.
+    """
+
+    def __init__(self, frame_rate):
+        """ Initializer
+
+        :param frame_rate: frames per second
+        """
+        self.set_frame_rate(frame_rate)
+        self.deadline = None
+        self.frames = 0
+        self.missed = 0
+
+    def set_frame_rate(self, frame_rate):
+        """ Change frame rate
+
+        :param frame_rate: frames per second
+        """
+        self.frame_rate = frame_rate
+        self.period = 1.0 / frame_rate
+
+    def start(self):
+        """ Start counting deadlines from now """
+
+        self.deadline = time.monotonic() + self.period
+
+    def get_remaining_time(self):
+        """ Get time left till the next deadline
+
+        :return: remaining time in seconds
+        """
+        if self.deadline == None:
+            return 0
+
+        return max(0, self.deadline - time.monotonic())
+
+    def wait(self):
+        """ Sleep till the next deadline.
+        If the deadline was missed the schedule restarts from now instead of rendering a burst of late frames.
+        """
+        if self.deadline == None:
+            self.start()
+
+        now = time.monotonic()
+        self.frames += 1
+
+        if now < self.deadline:
+            time.sleep(self.deadline - now)
+            self.deadline += self.period
+        else:
+            self.missed += 1 + int((now - self.deadline) / self.period)
+            self.deadline = now + self.period
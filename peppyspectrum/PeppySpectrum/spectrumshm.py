@@ -0,0 +1,247 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import time
+import mmap
+import struct
+import logging
+
+from random import randrange
+from spectrumframe import encode_frame, get_frame_size
+
+# Ring buffer layout:
+# header (64 bytes): magic, version, number of slots, frame size, sequence number of the last written frame
+# slot: sequence number of the frame in the slot (8 bytes) followed by the frame
+MAGIC = b"PSRB"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQ")
+HEADER_SIZE = 64
+SEQUENCE_OFFSET = 16
+SLOT_SEQUENCE = struct.Struct("<Q")
+DEFAULT_SLOTS = 8
+OPEN_RETRY_INTERVAL = 1.0
+MAX_POLL_FACTOR = 8 # the poll interval grows up to this number of intervals while there are no new frames
+
+def get_slot_size(frame_size):
+    """ Get the size of one ring buffer slot aligned to 8 bytes
+
+    :param frame_size: frame size in bytes
+
+    :return: slot size in bytes
+    """
+    return SLOT_SEQUENCE.size + ((frame_size + 7) & ~7)
+
+class SpectrumShmReader(object):
+    """ Reader of the spectrum frames from the shared memory ring buffer.
+    Returns the copy of the newest frame and counts the frames dropped by the writer.
+    The poll interval is doubled while there are no new frames and restored when the frame arrives.
+    The missing or invalid ring buffer is opened again periodically.
+    """
+
+    def __init__(self, name, frame_size, poll_interval):
+        """ Initializer
+
+        :param name: the path of the ring buffer file e.g. /dev/shm/peppy_spectrum
+        :param frame_size: expected frame size in bytes
+        :param poll_interval: interval in seconds to check for the new frame
+        """
+        self.name = name
+        self.frame_size = frame_size
+        self.poll_interval = poll_interval
+        self.current_interval = poll_interval
+        self.buffer = None
+        self.open_time = time.monotonic()
+        self.open_failed = False
+        self.sequence = 0
+        self.dropped = 0
+        self.reads = 0
+        self.bytes = 0
+
+    def is_open(self):
+        """ Check if the ring buffer is mapped
+
+        :return: True - mapped, False - not mapped
+        """
+        return self.buffer != None
+
+    def open(self):
+        """ Map the ring buffer file """
+
+        self.open_time = time.monotonic()
+        try:
+            fd = os.open(self.name, os.O_RDONLY)
+            try:
+                self.buffer = mmap.mmap(fd, 0, mmap.MAP_SHARED, mmap.PROT_READ)
+            finally:
+                os.close(fd)
+        except Exception as e:
+            if not self.open_failed:
+                logging.debug("Cannot open shared memory: " + self.name)
+                logging.debug(e)
+            self.open_failed = True
+            return
+
+        magic, version, self.slots, frame_size, self.sequence = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION or frame_size != self.frame_size:
+            if not self.open_failed:
+                logging.debug(f"Invalid shared memory ring buffer: {self.name}")
+            self.open_failed = True
+            self.close()
+            return
+
+        self.slot_size = get_slot_size(frame_size)
+        self.open_failed = False
+
+    def retry_open(self, timeout):
+        """ Try to map the missing ring buffer again, wait if it's still missing
+
+        :param timeout: waiting time in seconds
+
+        :return: True - the ring buffer is mapped, False - the ring buffer is still missing
+        """
+        if time.monotonic() - self.open_time >= OPEN_RETRY_INTERVAL:
+            self.open()
+
+        if self.buffer == None:
+            time.sleep(timeout)
+            return False
+
+        return True
+
+    def close(self):
+        """ Unmap the ring buffer file """
+
+        if self.buffer != None:
+            try:
+                self.buffer.close()
+            except Exception as e:
+                logging.debug(e)
+            self.buffer = None
+
+    def flush(self):
+        """ Skip all frames written so far """
+
+        if self.buffer != None:
+            self.sequence = SLOT_SEQUENCE.unpack_from(self.buffer, SEQUENCE_OFFSET)[0]
+
+    def read(self, timeout=0):
+        """ Wait for the new frame and return its copy.
+        The slot sequence is checked again after copying, the frame is dropped if the writer has overwritten the slot.
+
+        :param timeout: maximum waiting time in seconds
+
+        :return: the newest frame or None if there is no new frame
+        """
+        if self.buffer == None and not self.retry_open(timeout):
+            return None
+
+        deadline = time.monotonic() + timeout
+        while True:
+            sequence = SLOT_SEQUENCE.unpack_from(self.buffer, SEQUENCE_OFFSET)[0]
+            if sequence != self.sequence:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.current_interval, remaining))
+            self.current_interval = min(self.current_interval * 2, self.poll_interval * MAX_POLL_FACTOR)
+
+        self.current_interval = self.poll_interval
+        offset = HEADER_SIZE + (sequence % self.slots) * self.slot_size
+        if SLOT_SEQUENCE.unpack_from(self.buffer, offset)[0] != sequence:
+            return None # the slot is being overwritten
+
+        start = offset + SLOT_SEQUENCE.size
+        frame = self.buffer[start : start + self.frame_size]
+        if SLOT_SEQUENCE.unpack_from(self.buffer, offset)[0] != sequence:
+            return None # the slot was overwritten while copying
+
+        if sequence > self.sequence + 1:
+            self.dropped += sequence - self.sequence - 1
+        self.sequence = sequence
+        self.reads += 1
+        self.bytes += len(frame)
+
+        return frame
+
+class SpectrumShmWriter(object):
+    """ Reference writer of the shared memory ring buffer """
+
+    def __init__(self, name, frame_size, slots=DEFAULT_SLOTS):
+        """ Initializer
+
+        :param name: the path of the ring buffer file
+        :param frame_size: frame size in bytes
+        :param slots: the number of frames in the ring
+        """
+        self.frame_size = frame_size
+        self.slots = slots
+        self.slot_size = get_slot_size(frame_size)
+        self.sequence = 0
+
+        size = HEADER_SIZE + slots * self.slot_size
+        fd = os.open(name, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            os.ftruncate(fd, size)
+            self.buffer = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        HEADER.pack_into(self.buffer, 0, MAGIC, VERSION, slots, frame_size, 0)
+
+    def write(self, frame):
+        """ Write frame into the next slot and publish it
+
+        :param frame: frame bytes
+        """
+        sequence = self.sequence + 1
+        offset = HEADER_SIZE + (sequence % self.slots) * self.slot_size
+        start = offset + SLOT_SEQUENCE.size
+
+        SLOT_SEQUENCE.pack_into(self.buffer, offset, 0)
+        self.buffer[start : start + self.frame_size] = frame
+        SLOT_SEQUENCE.pack_into(self.buffer, offset, sequence)
+        SLOT_SEQUENCE.pack_into(self.buffer, SEQUENCE_OFFSET, sequence)
+        self.sequence = sequence
+
+    def close(self):
+        """ Unmap the ring buffer file """
+
+        self.buffer.close()
+
+if __name__ == "__main__":
+    """ Write random frames to the ring buffer: spectrumshm.py [path] [size] [rate] [legacy|compact] """
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "/dev/shm/peppy_spectrum"
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 25
+    compact = len(sys.argv) > 4 and sys.argv[4] == "compact"
+
+    if compact:
+        writer = SpectrumShmWriter(name, get_frame_size(size, 1))
+    else:
+        writer = SpectrumShmWriter(name, 4 * size)
+
+    while True:
+        values = [randrange(0, 100) for _ in range(size)]
+        if compact:
+            writer.write(encode_frame(values, writer.sequence + 1))
+        else:
+            writer.write(struct.pack(f"<{size}I", *values))
+        time.sleep(1 / rate)
@@ -0,0 +1,192 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import json
+import logging
+import numpy as np
+
+STATS_FRAMES = 1024 # the number of the latest frames kept in the ring buffer
+TIMERS = ["read", "decode", "draw", "update"]
+READ, DECODE, DRAW, UPDATE = range(len(TIMERS))
+DECODER_COUNTERS = {"frames.dropped": "dropped", "frames.invalid": "invalid", "latency.us": "latency"}
+SOURCE_COUNTERS = {"source.reads": "reads", "source.bytes": "bytes", "source.dropped": "dropped"}
+COUNTERS = list(DECODER_COUNTERS) + list(SOURCE_COUNTERS)
+
+def get_counters(decoder, data_source):
+    """ Collect counters of the frame decoder and the data source.
+    Data source counters are collected only if the data source has them.
+    The latency is available only for compact frames which have the timestamp.
+
+    :param decoder: the frame decoder
+    :param data_source: the data source
+
+    :return: dictionary with counters
+    """
+    counters = {}
+    for name, attribute in DECODER_COUNTERS.items():
+        counters[name] = getattr(decoder, attribute)
+
+    if decoder.frames == 0:
+        del counters["latency.us"]
+
+    for name, attribute in SOURCE_COUNTERS.items():
+        if hasattr(data_source, attribute):
+            counters[name] = getattr(data_source, attribute)
+
+    return counters
+
+class SpectrumStats(object):
+    """ Per-frame instrumentation of the render loop.
+    The measured methods of the spectrum are replaced by the timed wrappers only when the statistics are enabled,
+    so the disabled instrumentation costs nothing. Times of the latest frames are kept in the preallocated
+    ring buffer. The stats file is written on the interval or on request e.g. from the SIGUSR1 handler.
+    """
+
+    def __init__(self, path, interval, capacity=STATS_FRAMES):
+        """ Initializer
+
+        :param path: the stats file
+        :param interval: the interval between writes in seconds, 0 - write on request only
+        :param capacity: the number of frames in the ring buffer
+        """
+        self.path = path
+        self.interval = interval
+        self.times = np.zeros((capacity, len(TIMERS)))
+        self.current = [0.0] * len(TIMERS)
+        self.position = 0
+        self.frames_decoded = 0
+        self.frames_rendered = 0
+        self.spectrum = None
+        self.write_requested = False
+        self.write_time = time.monotonic()
+
+    def attach(self, spectrum):
+        """ Replace the measured methods of the spectrum by the timed ones
+
+        :param spectrum: the spectrum
+        """
+        self.spectrum = spectrum
+        spectrum.get_latest_data = self.get_timer(READ, spectrum.get_latest_data)
+        spectrum.get_heights = self.get_timer(DECODE, spectrum.get_heights, count=True)
+        spectrum.clean_draw_update = self.get_timer(DRAW, spectrum.clean_draw_update)
+        spectrum.update = self.get_timer(UPDATE, spectrum.update)
+        spectrum.update_rectangle = self.get_timer(UPDATE, spectrum.update_rectangle)
+
+    def get_timer(self, timer, function, count=False):
+        """ Create the function which adds its execution time to the timer of the current frame
+
+        :param timer: the timer index
+        :param function: the function to measure
+        :param count: True - count calls as decoded frames
+
+        :return: the measured function
+        """
+        current = self.current
+
+        def timed(*args):
+            start = time.perf_counter()
+            result = function(*args)
+            current[timer] += time.perf_counter() - start
+            if count:
+                self.frames_decoded += 1
+            return result
+
+        return timed
+
+    def end_frame(self):
+        """ Store times of the rendered frame in the ring buffer and write the stats file if it's time """
+
+        current = self.current
+        current[DRAW] -= current[UPDATE] # draw time includes the screen update
+        self.times[self.position % len(self.times)] = current
+        self.position += 1
+        self.frames_rendered += 1
+        self.skip_frame()
+
+    def skip_frame(self):
+        """ Discard times measured without rendering e.g. waiting for data in idle mode """
+
+        current = self.current
+        for n in range(len(current)):
+            current[n] = 0.0
+
+        self.check()
+
+    def check(self):
+        """ Write the stats file if it was requested or the interval has passed """
+
+        if self.write_requested or (self.interval > 0 and time.monotonic() - self.write_time >= self.interval):
+            self.write_requested = False
+            self.write_time = time.monotonic()
+            self.write()
+
+    def request_write(self, signum=None, frame=None):
+        """ Request writing the stats file. Can be used as the signal handler.
+
+        :param signum: the signal number
+        :param frame: the current stack frame
+        """
+        self.write_requested = True
+
+    def get_stats(self):
+        """ Collect counters and the timer percentiles of the frames in the ring buffer
+
+        :return: dictionary with statistics
+        """
+        stats = {
+            "time": round(time.time(), 3),
+            "frames.rendered": self.frames_rendered,
+            "frames.decoded": self.frames_decoded
+        }
+
+        spectrum = self.spectrum
+        if spectrum:
+            if spectrum.worker:
+                stats["frames.decoded"], counters = spectrum.worker.get_counters() # the data source is in the worker process
+            else:
+                counters = get_counters(spectrum.frame_decoder, spectrum.data_source)
+            stats.update(counters)
+            stats["missed.deadlines"] = spectrum.scheduler.missed
+            stats["idle"] = spectrum.idle
+
+        n = min(self.position, len(self.times))
+        stats["window"] = n
+        if n > 0:
+            times = self.times[:n] * 1000
+            p50, p99 = np.percentile(times, [50, 99], axis=0)
+            mean = times.mean(axis=0)
+            peak = times.max(axis=0)
+            for i, name in enumerate(TIMERS):
+                if spectrum and spectrum.worker and i in (READ, DECODE):
+                    continue # measured in the worker process
+                stats[name + ".ms"] = [round(float(v[i]), 3) for v in (mean, p50, p99, peak)] # mean, p50, p99, max
+
+        return stats
+
+    def write(self):
+        """ Write the stats file as one line of JSON """
+
+        temp = f"{self.path}.tmp"
+        try:
+            with open(temp, "w") as f:
+                f.write(json.dumps(self.get_stats(), separators=(",", ":")) + "\n")
+            os.replace(temp, self.path)
+        except Exception as e:
+            logging.debug(f"Cannot write stats file: {self.path}")
+            logging.debug(e)
@@ -15,8 +15,30 @@
 # You should have received a copy of the GNU General Public License
 # along with PeppyMeter. If not, see <http://www.gnu.org/licenses/>.
 
+import sys
 import pygame
+import logging
+
 from PIL import Image
+from spectrumimagecache import SpectrumImageCache
+
+IMAGE_FORMAT = "alpha"
+SCALE_FILTERS = {
+    "nearest": Image.NEAREST,
+    "box": Image.BOX,
+    "bilinear": Image.BILINEAR,
+    "hamming": Image.HAMMING,
+    "bicubic": Image.BICUBIC,
+    "lanczos": Image.LANCZOS
+}
+if sys.byteorder == "little":
+    RGBA_MASKS = (0xFF, 0xFF00, 0xFF0000, 0xFF000000)
+    BGRA_MASKS = (0xFF0000, 0xFF00, 0xFF, 0xFF000000)
+else:
+    RGBA_MASKS = (0xFF000000, 0xFF0000, 0xFF00, 0xFF)
+    BGRA_MASKS = (0xFF00, 0xFF0000, 0xFF000000, 0xFF)
+SMOOTH_FILTER = "smooth" # pygame smoothscale
+FAST_FILTER = "fast" # pygame scale without filtering
 
 class SpectrumUtil(object):
     """ Utility class """
@@ -24,7 +46,18 @@ class SpectrumUtil(object):
     def __init__(self):
         """ Initializer """
 
-        self.image_cache = {}
+        self.image_cache = SpectrumImageCache()
+        self.scale_filter = SMOOTH_FILTER
+
+    def set_scale_filter(self, scale_filter):
+        """ Set resampling filter used by scale_image
+
+        :param scale_filter: smooth, fast or one of PIL filters: nearest, box, bilinear, hamming, bicubic, lanczos
+        """
+        if scale_filter in SCALE_FILTERS or scale_filter in (SMOOTH_FILTER, FAST_FILTER):
+            self.scale_filter = scale_filter
+        else:
+            logging.debug(f"Unknown scale filter: {scale_filter}")
     
     def load_pygame_image(self, path):
         """ Check if image is in the cache.
@@ -36,12 +69,10 @@ class SpectrumUtil(object):
         
         :return: pygame image
         """
-        image = None
-        try:
-            i = self.image_cache[path]            
-            return (path, i)
-        except KeyError:
-            pass
+        key = (path, None, IMAGE_FORMAT)
+        image = self.image_cache.get(key)
+        if image:
+            return (path, image)
             
         try:            
             image = pygame.image.load(path).convert_alpha()
@@ -49,29 +80,92 @@ class SpectrumUtil(object):
             pass
             
         if image:
-            self.image_cache[path] = image
+            self.image_cache.put(key, image)
             return (path, image)
         else:
             return None
 
     def scale_image(self, image, ratio):
-        """ Scale image using specified ratio
+        """ Scale image using specified ratio. Images loaded from files are cached by path and size.
         
-        :param image: image to scale
+        :param image: image to scale, tuple (path, image) or image
         :param ratio: scaling ratio
               
         :return: scaled image
         """
         if image == None:
             return None
-        s = pygame.Surface(ratio, flags=pygame.SRCALPHA)
+
+        key = None
         if isinstance(image, tuple):
+            key = (image[0], tuple(ratio), IMAGE_FORMAT)
             image = image[1]
+            s = self.image_cache.get(key)
+            if s:
+                return s
+
+        ratio = tuple(ratio)
+        if self.scale_filter == SMOOTH_FILTER and image.get_bitsize() in (24, 32):
+            s = pygame.transform.smoothscale(image, ratio)
+        elif self.scale_filter == FAST_FILTER or self.scale_filter == SMOOTH_FILTER:
+            s = pygame.transform.scale(image, ratio)
+        else:
+            s = self.resample_image(image, ratio, SCALE_FILTERS[self.scale_filter])
 
-        d = pygame.image.tostring(image, "RGBA", False)
-        img = Image.frombytes("RGBA", image.get_size(), d)
-        i = img.resize(ratio)
-        d = pygame.image.fromstring(i.tobytes(), i.size, i.mode)
-        s.blit(d, (0, 0))
+        if key:
+            self.image_cache.put(key, s)
 
         return s
+
+    def get_alpha_mode(self):
+        """ Get the byte order of the surfaces converted to the display format with alpha
+
+        :return: RGBA, BGRA or None if the display is not set or has other format
+        """
+        if pygame.display.get_surface() == None:
+            return None
+
+        masks = pygame.Surface((1, 1), pygame.SRCALPHA, 32).convert_alpha().get_masks()
+        if masks == RGBA_MASKS:
+            return "RGBA"
+        elif masks == BGRA_MASKS:
+            return "BGRA"
+        else:
+            return None
+
+    def resample_image(self, image, size, resample):
+        """ Scale image with PIL filter. PIL reads the surface pixels in place when their layout is RGBA.
+        The resampled pixels are copied once in the byte order of the display format,
+        the surface is converted to the display format only if the display has other byte order.
+
+        :param image: image to scale
+        :param size: the target size
+        :param resample: PIL resampling filter
+
+        :return: scaled image
+        """
+        w, h = image.get_size()
+        masks = image.get_masks()
+        if image.get_bitsize() == 32 and masks == RGBA_MASKS:
+            raw_mode = "RGBA"
+        elif image.get_bitsize() == 32 and masks == BGRA_MASKS:
+            raw_mode = "BGRA"
+        else:
+            raw_mode = None
+
+        if raw_mode:
+            pixels = image.get_buffer()
+            img = Image.frombuffer("RGBA", (w, h), pixels, "raw", raw_mode, image.get_pitch(), 1)
+            scaled = img.resize(size, resample)
+            del img, pixels # unlock the surface
+        else:
+            img = Image.frombytes("RGBA", (w, h), pygame.image.tostring(image, "RGBA", False))
+            scaled = img.resize(size, resample)
+
+        alpha_mode = self.get_alpha_mode()
+        if alpha_mode:
+            return pygame.image.frombuffer(scaled.tobytes("raw", alpha_mode), scaled.size, alpha_mode)
+        elif pygame.display.get_surface() != None:
+            return pygame.image.frombuffer(scaled.tobytes(), scaled.size, "RGBA").convert_alpha()
+        else:
+            return pygame.image.frombuffer(scaled.tobytes(), scaled.size, "RGBA")
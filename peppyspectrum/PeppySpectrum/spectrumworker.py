@@ -0,0 +1,315 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+import time
+import struct
+import logging
+import multiprocessing
+import numpy as np
+
+from random import randrange
+from spectrumframe import SpectrumFrameDecoder
+from spectrumstats import COUNTERS, get_counters
+from spectrumconfigparser import SIZE, UPDATE_UI_INTERVAL
+
+# Shared control words
+SEQUENCE = 0 # incremented for each frame written by the worker
+REQUESTED_INDEX = 1 # layout index set by the render process
+FRAME_INDEX = 2 # layout index used for the frame
+COUNT = 3 # the number of bars in the frame
+COUNTER_WORDS = 4 # the first of the counters collected by the worker, -1 - the data source has no such counter
+CONTROL_WORDS = COUNTER_WORDS + len(COUNTERS)
+
+class SpectrumWorker(object):
+    """ Worker process which owns the data source, decodes frames and quantizes bar heights.
+    Finished frames are handed to the render process through shared memory. Both sides access it
+    under the process-shared lock, the lock operations are the memory barriers on weakly ordered CPUs.
+    The worker is started with the spawn method, so it doesn't inherit the state of the initialized SDL.
+    """
+
+    def __init__(self, config, layouts):
+        """ Initializer
+
+        :param config: the configuration dictionary
+        :param layouts: the list of layouts providing quantization
+        """
+        self.config = config
+        self.layouts = layouts
+        self.size = config[SIZE]
+        self.interval = config[UPDATE_UI_INTERVAL]
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.control_memory = None
+        self.heights_memory = None
+        self.control = None
+        self.heights = None
+        self.lock = None
+        self.stop_event = None
+        self.sequence = 0
+
+    def __getstate__(self):
+        """ Get the state sent to the worker process, numpy views and process objects are not sent
+
+        :return: dictionary with the state
+        """
+        state = self.__dict__.copy()
+        for name in ("context", "process", "control", "heights"):
+            state[name] = None
+        return state
+
+    def attach(self):
+        """ Create numpy views of the shared memory """
+
+        self.control = np.frombuffer(self.control_memory, dtype=np.int64)
+        self.heights = np.frombuffer(self.heights_memory, dtype=np.float64)
+
+    def start(self):
+        """ Create shared memory and start worker process """
+
+        self.control_memory = self.context.RawArray("q", CONTROL_WORDS)
+        self.heights_memory = self.context.RawArray("d", self.size)
+        self.lock = self.context.Lock()
+        self.stop_event = self.context.Event()
+        self.attach()
+        self.control[COUNTER_WORDS:] = -1 # no counters before the first frame
+        self.sequence = 0
+
+        self.process = self.context.Process(target=self.run, args=(os.getpid(),), daemon=True)
+        self.process.start()
+
+    def stop(self):
+        """ Stop worker process and release shared memory """
+
+        if self.process != None:
+            self.stop_event.set()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+            self.process = None
+
+        self.control = self.heights = None
+        self.control_memory = self.heights_memory = None
+
+    def set_index(self, index):
+        """ Set the layout index for the next frames
+
+        :param index: layout index
+        """
+        with self.lock:
+            self.control[REQUESTED_INDEX] = index
+
+    def read(self):
+        """ Read the newest frame. Called by the render process, doesn't wait while the worker writes.
+
+        :return: tuple (bar heights, layout index) or None if there is no new frame
+        """
+        if not self.lock.acquire(block=False):
+            return None
+
+        try:
+            sequence = int(self.control[SEQUENCE])
+            if sequence == self.sequence:
+                return None
+            index = int(self.control[FRAME_INDEX])
+            heights = self.heights[:int(self.control[COUNT])].copy()
+        finally:
+            self.lock.release()
+
+        self.sequence = sequence
+        return (heights, index)
+
+    def write(self, heights, index, counters):
+        """ Write frame into shared memory. Called by the worker process.
+
+        :param heights: array of bar heights
+        :param index: the layout index used for the heights
+        :param counters: the decoder and data source counters
+        """
+        n = min(len(heights), self.size)
+        with self.lock:
+            self.heights[:n] = heights[:n]
+            self.control[FRAME_INDEX] = index
+            self.control[COUNT] = n
+            self.control[SEQUENCE] += 1
+            self.write_counters(counters)
+
+    def write_counters(self, counters):
+        """ Write counters into shared memory. Called by the worker process holding the lock.
+
+        :param counters: the decoder and data source counters
+        """
+        for n, name in enumerate(COUNTERS):
+            self.control[COUNTER_WORDS + n] = counters.get(name, -1)
+
+    def get_counters(self):
+        """ Get the counters collected by the worker process
+
+        :return: tuple (the number of frames written by the worker, dictionary with counters)
+        """
+        with self.lock:
+            frames = int(self.control[SEQUENCE])
+            values = self.control[COUNTER_WORDS:].tolist()
+
+        return (frames, {name: value for name, value in zip(COUNTERS, values) if value >= 0})
+
+    def get_requested_index(self):
+        """ Get the layout index requested by the render process
+
+        :return: layout index
+        """
+        with self.lock:
+            return int(self.control[REQUESTED_INDEX])
+
+    def run(self, parent):
+        """ Worker process loop. Creates its own data source and frame decoder.
+
+        :param parent: the render process ID, the worker exits when the parent is gone
+        """
+        from spectrum import create_data_source
+
+        self.attach()
+        decoder = SpectrumFrameDecoder(self.size)
+        data_source = create_data_source(self.config)
+        data_source.open()
+        data_source.flush()
+        silence = bytes(4 * self.size)
+        frame_time = time.monotonic()
+
+        while not self.stop_event.is_set() and os.getppid() == parent:
+            try:
+                data = data_source.read(self.interval)
+            except Exception as e:
+                logging.debug(e)
+                continue
+
+            now = time.monotonic()
+            if data != None:
+                frame_time = now
+            elif now - frame_time > 2 * self.interval:
+                data = silence # no frame during two update intervals, as in Spectrum.get_latest_data
+
+            if not data:
+                continue
+
+            index = self.get_requested_index()
+            try:
+                values = decoder.decode(data)
+            except Exception as e:
+                logging.debug(e)
+                continue
+
+            if values is None:
+                logging.debug(f"Invalid frame dropped, size: {len(data)}")
+                with self.lock:
+                    self.write_counters(get_counters(decoder, data_source))
+                continue
+
+            self.write(self.layouts[index].quantize(values), index, get_counters(decoder, data_source))
+
+        data_source.close()
+
+def write_test_frames(name, size, rate, parent):
+    """ Write random frames to the shared memory ring buffer
+
+    :param name: the ring buffer path
+    :param size: the number of bars
+    :param rate: frames per second
+    :param parent: the benchmark process ID, the writer exits when the parent is gone
+    """
+    from spectrumshm import SpectrumShmWriter
+
+    writer = SpectrumShmWriter(name, 4 * size)
+    while os.getppid() == parent:
+        writer.write(struct.pack(f"<{size}I", *[randrange(0, 100) for _ in range(size)]))
+        time.sleep(1 / rate)
+
+def benchmark(frames, rate):
+    """ Render frames paced at the configured frame rate in single-process and multiprocess modes.
+    Both modes get the same data rate and render the same number of frames, so the render process CPU load
+    and the frame time are compared for the same input.
+
+    :param frames: the number of frames to render in each mode
+    :param rate: data frames per second written by the test writer
+
+    :return: dictionary with results for both modes
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1" # keep stdout for JSON
+    from spectrum import Spectrum
+    from spectrumconfigparser import DATA_SOURCE, SHM_NAME, MULTIPROCESS
+
+    name = f"/dev/shm/peppy_spectrum_benchmark_{os.getpid()}"
+    context = multiprocessing.get_context("spawn")
+    results = {}
+
+    for multiprocess in (False, True):
+        spectrum = Spectrum(None, True)
+        spectrum.config[DATA_SOURCE] = "shm"
+        spectrum.config[SHM_NAME] = name
+        spectrum.config[MULTIPROCESS] = multiprocess
+        spectrum.data_source = spectrum.get_data_source()
+
+        writer = context.Process(target=write_test_frames, args=(name, spectrum.config[SIZE], rate, os.getpid()), daemon=True)
+        writer.start()
+        time.sleep(1)
+
+        published = [0]
+        publish = spectrum.publish
+        def count(heights, index):
+            published[0] += 1
+            publish(heights, index)
+        spectrum.publish = count
+
+        spectrum.start()
+        spectrum.refresh()
+        time.sleep(0.5) # let the worker open the data source
+        render_time = 0
+        start_time = time.monotonic()
+        start_cpu = time.process_time()
+        spectrum.scheduler.start()
+        for _ in range(frames):
+            render_start = time.monotonic()
+            spectrum.render_frame()
+            render_time += time.monotonic() - render_start
+            spectrum.scheduler.wait()
+        wall = time.monotonic() - start_time
+        cpu = time.process_time() - start_cpu
+        spectrum.stop()
+        writer.kill()
+
+        results["multiprocess" if multiprocess else "single"] = {
+            "frames": frames,
+            "frame.rate": spectrum.scheduler.frame_rate,
+            "data.frames": published[0],
+            "missed.deadlines": spectrum.scheduler.missed,
+            "frame.time.ms": round(render_time / frames * 1000, 3),
+            "render.process.cpu": round(cpu / wall, 3)
+        }
+
+    os.remove(name)
+    return results
+
+if __name__ == "__main__":
+    """ Compare single-process and multiprocess modes: spectrumworker.py [frames] [data rate] """
+
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    print(json.dumps(benchmark(frames, rate), indent=4))
+    os._exit(0)
@@ -0,0 +1,134 @@
+# Copyright 2016-2024 Peppy Player peppy.player@gmail.com
+#
+# This file is part of Peppy Player.
+#
+# Peppy Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Peppy Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Peppy Player. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pygame
+
+from spectrumframebufferdevice import SpectrumFramebufferDevice
+
+WIDTH = 8
+HEIGHT = 4
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255), (18, 52, 86), (0, 0, 0)]
+
+class SpectrumVirtualFramebuffer(SpectrumFramebufferDevice):
+    """ Regular file with the screen info of the panned virtual screen """
+
+    def __init__(self, name, x_offset, y_offset, virtual_width, virtual_height):
+        """ Initializer
+
+        :param name: the file path
+        :param x_offset: the X offset of the visible area
+        :param y_offset: the Y offset of the visible area
+        :param virtual_width: the width of the virtual screen
+        :param virtual_height: the height of the virtual screen
+        """
+        SpectrumFramebufferDevice.__init__(self, name, WIDTH, HEIGHT, 32)
+        self.info = (x_offset, y_offset, virtual_width, virtual_height)
+
+    def read_screen_info(self):
+        """ Set the virtual screen geometry and create the file
+
+        :return: True - the screen info is set
+        """
+        self.x_offset, self.y_offset, virtual_width, self.virtual_height = self.info
+        self.line_length = virtual_width * 4
+        os.ftruncate(self.fd, self.line_length * self.virtual_height)
+
+        return True
+
+class TestSpectrumFramebufferDevice(unittest.TestCase):
+    """ Conversion of the offscreen surface to the framebuffer pixels written to a regular file """
+
+    def setUp(self):
+        """ Create the surface with known colors and the framebuffer file """
+
+        self.surface = pygame.Surface((WIDTH, HEIGHT), 0, 32)
+        for y in range(HEIGHT):
+            for x in range(WIDTH):
+                self.surface.set_at((x, y), COLORS[(x + y) % len(COLORS)])
+
+        fd, self.path = tempfile.mkstemp(prefix="peppy_spectrum_fb_")
+        os.close(fd)
+
+    def tearDown(self):
+        """ Remove the framebuffer file """
+
+        os.remove(self.path)
+
+    def get_expected(self, pack):
+        """ Get pixels of the surface packed to the framebuffer format
+
+        :param pack: the function which packs (r, g, b) to the pixel value
+
+        :return: 2D array of pixels indexed by y, x
+        """
+        return np.array([[pack(*self.surface.get_at((x, y))[:3]) for x in range(WIDTH)] for y in range(HEIGHT)])
+
+    def write(self, device, rects=None):
+        """ Copy the surface to the framebuffer file
+
+        :param device: the framebuffer device
+        :param rects: rectangles to copy, None - the whole surface
+        """
+        self.assertTrue(device.open())
+        device.update(self.surface, rects if rects != None else self.surface.get_rect())
+        device.close()
+
+    def test_xrgb8888(self):
+        device = SpectrumFramebufferDevice(self.path, WIDTH, HEIGHT, 32)
+        self.write(device)
+
+        pixels = np.fromfile(self.path, dtype="<u4").reshape(HEIGHT, WIDTH) & 0xFFFFFF
+        expected = self.get_expected(lambda r, g, b: (r << 16) | (g << 8) | b)
+        np.testing.assert_array_equal(pixels, expected)
+
+    def test_rgb565(self):
+        device = SpectrumFramebufferDevice(self.path, WIDTH, HEIGHT, 16)
+        self.write(device)
+
+        pixels = np.fromfile(self.path, dtype="<u2").reshape(HEIGHT, WIDTH)
+        expected = self.get_expected(lambda r, g, b: ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3))
+        np.testing.assert_array_equal(pixels, expected)
+
+    def test_dirty_rectangle(self):
+        device = SpectrumFramebufferDevice(self.path, WIDTH, HEIGHT, 32)
+        self.write(device, [pygame.Rect(2, 1, 3, 2)])
+
+        pixels = np.fromfile(self.path, dtype="<u4").reshape(HEIGHT, WIDTH) & 0xFFFFFF
+        expected = self.get_expected(lambda r, g, b: (r << 16) | (g << 8) | b)
+        np.testing.assert_array_equal(pixels[1:3, 2:5], expected[1:3, 2:5])
+        self.assertEqual(np.count_nonzero(pixels) - np.count_nonzero(pixels[1:3, 2:5]), 0)
+
+    def test_offsets(self):
+        device = SpectrumVirtualFramebuffer(self.path, 3, 5, WIDTH + 4, 2 * HEIGHT + 2)
+        self.write(device)
+
+        pixels = np.fromfile(self.path, dtype="<u4").reshape(2 * HEIGHT + 2, WIDTH + 4) & 0xFFFFFF
+        expected = self.get_expected(lambda r, g, b: (r << 16) | (g << 8) | b)
+        np.testing.assert_array_equal(pixels[5 : 5 + HEIGHT, 3 : 3 + WIDTH], expected)
+        self.assertEqual(np.count_nonzero(pixels) - np.count_nonzero(expected), 0)
+
+if __name__ == "__main__":
+    unittest.main()
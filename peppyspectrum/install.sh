@@ -22,7 +22,7 @@ sudo chown -R volumio "$spath" "$customfolder"
 sudo chgrp -R volumio "$spath" "$customfolder"
 echo "installing apt packages"
 
-sudo apt-get -y install python3-pygame python3-pillow libfftw3-dev
+sudo apt-get -y install python3-pygame python3-pillow python3-numpy libfftw3-dev
 ##echo "Installing peppyalsa plugin if needed"
 
 ARCH="$(arch)"